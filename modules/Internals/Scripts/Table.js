@@ -0,0 +1,115 @@
+// Sorting and pagination of the summary table
+var PAGE_SIZE = 100;
+
+function getRows(table)
+{
+    var rows = [];
+    for(var i = 0; i < table.rows.length; i++)
+    {
+        if(table.rows[i].getAttribute("data-name")!==null) {
+            rows.push(table.rows[i]);
+        }
+    }
+    return rows;
+}
+
+function showPage(table, page)
+{
+    var rows = getRows(table);
+    for(var i = 0; i < rows.length; i++) {
+        rows[i].style.display = (Math.floor(i/PAGE_SIZE)==page)?"":"none";
+    }
+    
+    var nav = document.getElementById(table.id+"_pages");
+    if(!nav) {
+        return;
+    }
+    
+    nav.innerHTML = "";
+    var pages = Math.ceil(rows.length/PAGE_SIZE);
+    if(pages<2) {
+        return;
+    }
+    
+    nav.appendChild(document.createTextNode("Pages: "));
+    for(var p = 0; p < pages; p++)
+    {
+        var link = document.createElement(p==page?"b":"a");
+        link.appendChild(document.createTextNode((p+1)+" "));
+        if(p!=page)
+        {
+            link.href = "#"+table.id;
+            link.onclick = (function(n) {
+                return function() { showPage(table, n); return false; };
+            })(p);
+        }
+        nav.appendChild(link);
+    }
+}
+
+function sortTable(table, key)
+{
+    var rows = getRows(table);
+    if(!rows.length) {
+        return;
+    }
+    
+    // second click on the same column reverses the order
+    var desc = (table.getAttribute("data-sorted")==key);
+    
+    rows.sort(function(a, b) {
+        var x = a.getAttribute("data-"+key);
+        var y = b.getAttribute("data-"+key);
+        
+        // rows without a value (added or removed objects) go last
+        if(x===null || x==="") {
+            return (y===null || y==="")?0:1;
+        }
+        if(y===null || y==="") {
+            return -1;
+        }
+        
+        var r = 0;
+        if(key=="name") {
+            r = (x.toLowerCase()<y.toLowerCase())?-1:((x.toLowerCase()>y.toLowerCase())?1:0);
+        }
+        else {
+            r = parseFloat(x)-parseFloat(y);
+        }
+        return desc?-r:r;
+    });
+    
+    var parent = rows[0].parentNode;
+    for(var i = 0; i < rows.length; i++) {
+        parent.appendChild(rows[i]);
+    }
+    
+    table.setAttribute("data-sorted", desc?"":key);
+    showPage(table, 0);
+}
+
+function initTable(id)
+{
+    var table = document.getElementById(id);
+    if(!table) {
+        return;
+    }
+    
+    var cells = table.getElementsByTagName("th");
+    for(var i = 0; i < cells.length; i++)
+    {
+        var key = cells[i].getAttribute("data-key");
+        if(key)
+        {
+            cells[i].style.cursor = "pointer";
+            if(!cells[i].title) {
+                cells[i].title = "Sort by this column";
+            }
+            cells[i].onclick = (function(k) {
+                return function() { sortTable(table, k); };
+            })(key);
+        }
+    }
+    
+    showPage(table, 0);
+}
@@ -45,6 +45,33 @@ import signal
 import subprocess
 import traceback
 import binascii
+import time
+import json
+import resource
+import hashlib
+import collections
+import sqlite3
+import fcntl
+import errno
+import struct
+import tarfile
+import gzip
+import io
+import socket
+import threading
+import zlib
+import ctypes
+import ctypes.util
+import select
+import stat
+
+try:
+    from os import scandir as SCAN_DIR
+except ImportError:
+    try:
+        from scandir import scandir as SCAN_DIR
+    except ImportError:
+        SCAN_DIR = None
 
 TOOL_VERSION = "0.97"
 
@@ -55,22 +82,119 @@ CTAGS = "ctags"
 ABI_CC_VER = "1.99.25"
 ABI_DUMPER_VER = "0.99.19"
 
+ABI_CC_CUR_VER = None
+
+# versions of tools by executable, probing Perl tools is slow
+TOOLS_CACHE = "tools.json"
+TOOLS = {}
+CMD_PATH = {}
+
 PKGS = {}
 PKGS_ATTR = {}
+PKG_ATTRS = {}
+PKG_ATTRS_CACHE = "pkg_attrs.json"
+PKG_DIGEST_BLOCK = 65536
+RPM_TAGS = {1000:"name", 1001:"version", 1002:"release", 1022:"arch"}
 FILES = {}
+HEADERS = {}
+OBJECTS = {}
+SAME_OBJECT = {}
+DYNSYM = {}
 PUBLIC_ABI = False
 
+# only "new" packages are given in the dump mode
+AGES = ["old", "new"]
+STAGED = {}
+
+# packages listed instead of extracted (-plan)
+PLAN_PKGS = []
+
 ARGS = {}
 MOD_DIR = None
 
 TMP_DIR = None
 TMP_DIR_INT = None
 
+# extracted packages in a RAM-backed workspace
+SPILL_DIR = None
+WORKSPACE_BUDGET = None
+WORKSPACE_ITEMS = {}
+WORKSPACE_RATIO = 4
+
+EXTRACT_CACHE_SIZE = "10G"
+
+# jobs run by workers on other hosts
+QUEUE_DB = "queue.db"
+QUEUE_LEASE = 60
+QUEUE_ATTEMPTS = 3
+QUEUE_POLL = 1
+QUEUE_BATCH = None
+# workers report they are alive every QUEUE_BEAT seconds,
+# rows of finished jobs left by lost coordinators are removed after QUEUE_KEEP
+QUEUE_BEAT = 5
+QUEUE_KEEP = 24*3600
+
+# watching a repository for new package versions
+WATCH_STATE = "watch_state.json"
+WATCH_INTERVAL = 60
+WATCH_SETTLE = 10
+IN_CLOSE_WRITE = 0x8
+IN_MOVED_TO = 0x80
+IN_CREATE = 0x100
+IN_NONBLOCK = 0x800
+IN_CLOEXEC = 0x80000
+
+PKG_FORMATS = ["rpm", "deb", "apk", "tbz2", "xpak"]
+NOARCH = ["noarch", "all", "any"]
+
 ORIG_DIR = os.getcwd()
 
 CMD_NAME = os.path.basename(__file__)
 
-ERROR_CODE = {"Ok":0, "Error":1, "Empty":10, "NoDebug":11, "NoABI":12}
+ERROR_CODE = {"Ok":0, "Error":1, "Empty":10, "NoDebug":11, "NoABI":12, "FailUnder":13}
+
+# peak memory of abi-dumper is estimated as DUMP_MEM_RATIO * size of
+# debuginfo + DUMP_MEM_BASE until the history of real runs is collected
+DUMP_MEM_RATIO = 8
+DUMP_MEM_BASE = 64*1024*1024
+
+# ratios of the history are taken from objects of at least HISTORY_MIN_SIZE
+# of debuginfo, the HISTORY_PERCENTILE of them is used
+HISTORY_MIN_SIZE = 1024*1024
+HISTORY_PERCENTILE = 90
+
+# abi-compliance-checker loads both ABI dumps
+CMP_MEM_RATIO = 4
+
+# fields of ABI dump ignored when checking if ABIs are identical
+DUMP_VOLATILE = ["LibraryVersion", "LibraryName", "ABI_DUMPER_VERSION"]
+DUMP_MEM_HISTORY = "mem_history.json"
+
+# checksums of files in exported bundles of ABI dumps
+BUNDLE_MANIFEST = "MANIFEST.json"
+
+# CPU time per byte of debuginfo or ABI dumps, rough defaults
+# until the history of real runs is collected
+DUMP_CPU_RATIO = 1.0/(16*1024*1024)
+CMP_CPU_RATIO = 1.0/(4*1024*1024)
+
+REPORTS_INDEX = "compat_report/reports.db"
+REPORTS_INDEX_COLS = ["path", "kind", "arch", "name", "old_version", "new_version", "bc", "bc_effective", "sc", "added", "removed", "problems", "src_problems", "objects_added", "objects_removed", "changed_soname", "objects_failed", "created"]
+
+RUNNING_JOBS = {}
+DUMP_INDEX = {}
+
+# timeline of stages and jobs (-trace)
+TRACE = None
+TRACE_START = None
+TRACE_LANES = {}
+TRACE_LOCK = threading.RLock()
+
+# MinHash signature of exported symbols: MINHASH_BANDS*MINHASH_ROWS hashes
+MINHASH_BANDS = 32
+MINHASH_ROWS = 2
+MINHASH_PRIME = 4294967311
+MIN_SIMILARITY = 0.5
 
 def init_options():
     global TOOL_VERSION, CMD_NAME
@@ -81,6 +205,10 @@ def init_options():
     parser.add_argument('-v', action='version', version='Package ABI Diff (Pkg-ABIdiff) '+TOOL_VERSION)
     parser.add_argument('-old', help='list of old packages (package itself, debug-info and devel package)', nargs='*', metavar='PATH')
     parser.add_argument('-new', help='list of new packages (package itself, debug-info and devel package)', nargs='*', metavar='PATH')
+    parser.add_argument('-dump', help='only create ABI dumps of one set of packages (package itself, debug-info and devel package) or of a staged install tree and save them to the dumps directory', nargs='+', metavar='PATH')
+    parser.add_argument('-dump-key', help='dumps directory key of a staged install tree', metavar='ARCH/NAME/VERSION')
+    parser.add_argument('-export', help='pack ABI dumps of ARCH/NAME/VERSION from the dumps directory into a checksummed bundle FILE (.tar.gz)', nargs=2, metavar=('ARCH/NAME/VERSION', 'FILE'))
+    parser.add_argument('-import', help='validate the bundle FILE and unpack its ABI dumps into the dumps directory', dest='import_bundle', metavar='FILE')
     parser.add_argument('-report-dir', '-o', help='specify a directory to save report (default: ./compat_report)', metavar='DIR')
     parser.add_argument('-dumps-dir', help='specify a directory to save and reuse ABI dumps (default: ./abi_dump)', metavar='DIR')
     parser.add_argument('-bin', help='check binary compatibility only', action='store_true')
@@ -91,11 +219,35 @@ def init_options():
     parser.add_argument('-quiet', help='do not warn about incompatible build options', action='store_true')
     parser.add_argument('-debug', help='enable debug messages', action='store_true')
     parser.add_argument('-tmp-dir', help='set a directory to store temp files', metavar='DIR')
+    parser.add_argument('-extract-cache', help='reuse extracted packages from DIR, shared by concurrent runs', metavar='DIR')
+    parser.add_argument('-extract-cache-size', help='remove least recently used packages from the extraction cache above SIZE (default: '+EXTRACT_CACHE_SIZE+')', metavar='SIZE')
+    parser.add_argument('-workspace', help='extract packages and keep logs in a RAM-backed directory, e.g. /dev/shm', metavar='DIR')
+    parser.add_argument('-workspace-size', help='size budget of the workspace, larger trees are moved to the temp directory, e.g. 4G (default: half of available RAM)', metavar='SIZE')
     parser.add_argument('-ignore-tags', help='optional file with tags to ignore by ctags', metavar='PATH')
     parser.add_argument('-keep-registers-and-offsets', help='dump used registers and stack offsets even if incompatible build options detected', action='store_true')
     parser.add_argument('-use-tu-dump', help='use g++ syntax tree instead of ctags to list symbols in headers', action='store_true')
     parser.add_argument('-include-preamble', help='specify preamble headers (separated by semicolon)', metavar='PATHS')
     parser.add_argument('-include-paths', help='specify include paths (separated by semicolon)', metavar='PATHS')
+    parser.add_argument('-jobs', '-j', help='run up to N ABI dumpers or checkers in parallel (default: 1)', type=int, default=1, metavar='N')
+    parser.add_argument('-mem-budget', help='total memory available for parallel jobs, e.g. 16G (default: available RAM)', metavar='SIZE')
+    parser.add_argument('-job-mem-limit', help='limit address space of each job, e.g. 4G (default: memory budget)', metavar='SIZE')
+    parser.add_argument('-job-timeout', help='kill a job running longer than SEC seconds and mark its object as N/A', type=int, metavar='SEC')
+    parser.add_argument('-plan', help='only list packages and read headers of shared objects, save the planned jobs with predicted cache hits and estimated CPU, memory and disk use to FILE (JSON)', metavar='FILE')
+    parser.add_argument('-quick', help='only compare exported symbols and their versions (.dynsym) of release packages, without debuginfo', action='store_true')
+    parser.add_argument('-reports-index', help='SQLite index of all created reports (default: '+REPORTS_INDEX+')', metavar='PATH')
+    parser.add_argument('-query', help='list reports from the index matching SQL condition on columns '+', '.join(REPORTS_INDEX_COLS)+', e.g. "bc < 95 AND created > strftime(\'%%s\', \'now\', \'-7 days\')"', nargs='?', const='1', metavar='CONDITION')
+    parser.add_argument('-reindex', help='add all reports found in DIR to the index', metavar='DIR')
+    parser.add_argument('-queue', help='publish ABI dumper and checker jobs to a queue in shared DIR and wait for workers to run them (temp, dumps and report directories and the working directory should be shared too)', metavar='DIR')
+    parser.add_argument('-queue-lease', help='run a job again if its worker has not renewed the lease for SEC seconds (default: '+str(QUEUE_LEASE)+')', type=int, default=QUEUE_LEASE, metavar='SEC')
+    parser.add_argument('-worker', help='run jobs from the queue in shared DIR', metavar='DIR')
+    parser.add_argument('-worker-idle', help='exit the worker after SEC seconds without jobs', type=int, metavar='SEC')
+    parser.add_argument('-watch', help='compare each new version of packages published to repository DIR with the previous one', metavar='DIR')
+    parser.add_argument('-watch-interval', help='scan the repository every SEC seconds if inotify is not available (default: '+str(WATCH_INTERVAL)+')', type=int, default=WATCH_INTERVAL, metavar='SEC')
+    parser.add_argument('-watch-settle', help='consider a package published when it has not been modified for SEC seconds (default: '+str(WATCH_SETTLE)+')', type=int, default=WATCH_SETTLE, metavar='SEC')
+    parser.add_argument('-snapshot', help='compare the latest versions of packages in two repository snapshots, only packages with changed shared objects are checked', nargs=2, metavar=('OLD_DIR', 'NEW_DIR'))
+    parser.add_argument('-fail-under', help='only check that BC/SC rates are not below thresholds and no SONAME changed, stop as soon as it is known and exit with code 13 otherwise, e.g. BC=95,SC=90', metavar='RATES')
+    parser.add_argument('-job-cpu-limit', help='kill a job using more than SEC seconds of CPU time and mark its object as N/A', type=int, metavar='SEC')
+    parser.add_argument('-trace', help='save a timeline of extraction, discovery, ABI dumpers, checkers and report writing to FILE in Chrome trace event format (JSON), viewable in Perfetto or chrome://tracing', metavar='FILE')
     
     return parser.parse_args()
 
@@ -118,25 +270,95 @@ def get_modules():
     s_exit("Error")
 
 def check_cmd(prog):
+    if prog in CMD_PATH:
+        return CMD_PATH[prog]
+    
+    CMD_PATH[prog] = None
     for path in os.environ["PATH"].split(os.pathsep):
         path = path.strip('"')
         candidate = path+"/"+prog
         if os.path.isfile(candidate) and os.access(candidate, os.X_OK):
-            return candidate
+            CMD_PATH[prog] = candidate
+            break
     
-    return None
+    return CMD_PATH[prog]
+
+def require_checker():
+    global ABI_CC_CUR_VER
+    if ABI_CC_CUR_VER:
+        return
+    
+    if not check_cmd(ABI_CC):
+        exit_status("Error", "ABI Compliance Checker "+ABI_CC_VER+" or newer is not installed")
+    
+    ABI_CC_CUR_VER = get_dumpversion(ABI_CC)
+    
+    if cmp_vers(ABI_CC_CUR_VER, ABI_CC_VER)<0:
+        exit_status("Error", "the version of ABI Compliance Checker should be "+ABI_CC_VER+" or newer")
+
+def require_dumper():
+    if not check_cmd(ABI_DUMPER):
+        exit_status("Error", "ABI Dumper "+ABI_DUMPER_VER+" or newer is not installed")
+    
+    if cmp_vers(get_dumpversion(ABI_DUMPER), ABI_DUMPER_VER)<0:
+        exit_status("Error", "the version of ABI Dumper should be "+ABI_DUMPER_VER+" or newer")
+
+def require_ctags():
+    if not check_cmd(CTAGS):
+        exit_status("Error", "Universal Ctags program is not installed")
+    
+    ctags_ver = get_version(CTAGS)
+    if ctags_ver.lower().find("universal")==-1:
+        exit_status("Error", "requires Universal Ctags")
 
 def s_exit(code):
     global TMP_DIR, TMP_DIR_INT, ERROR_CODE
     
-    chmod_777(TMP_DIR_INT)
-    shutil.rmtree(TMP_DIR_INT)
+    kill_jobs()
+    
+    if QUEUE_BATCH:
+        cancel_queued_jobs()
+    
+    if TRACE is not None:
+        save_trace()
+    
+    trash = [TMP_DIR_INT]
+    if SPILL_DIR:
+        trash.append(SPILL_DIR)
     
     if not ARGS.tmp_dir:
-        shutil.rmtree(TMP_DIR)
+        trash.append(TMP_DIR)
+    
+    remove_in_background(trash)
     
     sys.exit(ERROR_CODE[code])
 
+def remove_in_background(paths):
+    # renamed first, so the next run can reuse the temp directory
+    trash = []
+    for path in paths:
+        if not os.path.exists(path):
+            continue
+        
+        # nothing to wait for
+        try:
+            os.rmdir(path)
+            continue
+        except OSError:
+            pass
+        
+        trash_path = path+".removing."+str(os.getpid())
+        os.rename(path, trash_path)
+        trash.append(trash_path)
+    
+    if not trash:
+        return
+    
+    with open(os.devnull, "w") as null:
+        # files may be hardlinks to the extraction cache, so only directories are made writable
+        subprocess.Popen(["sh", "-c", "find \"$@\" -type d -exec chmod 777 {} +; rm -rf \"$@\"", "sh"]+trash,
+            stdout=null, stderr=null, close_fds=True, preexec_fn=os.setsid)
+
 def int_exit(signal, frame):
     print "\nGot INT signal"
     print "Exiting"
@@ -154,7 +376,11 @@ def extract_pkgs(age, kind):
     global PKGS, TMP_DIR_INT
     pkgs = PKGS[age][kind].keys()
     
-    extr_dir = TMP_DIR_INT+"/ext/"+age+"/"+kind
+    item = "ext/"+age+"/"+kind
+    extr_dir = TMP_DIR_INT+"/"+item
+    
+    if SPILL_DIR:
+        extr_dir = place_in_workspace(item, WORKSPACE_RATIO*sum([os.path.getsize(pkg) for pkg in pkgs]))
     
     if not os.path.exists(extr_dir):
         os.makedirs(extr_dir)
@@ -170,25 +396,309 @@ def extract_pkgs(age, kind):
             exit_status("Error", "unknown format of package \'"+pkg+"\'")
         
         pkg_abs = os.path.abspath(pkg)
+        start = time.time()
         
-        os.chdir(extr_dir)
-        if fmt=="rpm":
-            subprocess.call("rpm2cpio \""+pkg_abs+"\" | cpio -id --quiet", shell=True)
-        elif fmt=="deb":
-            subprocess.call(["dpkg-deb", "--extract", pkg_abs, "."])
-        elif fmt=="apk":
-            with open(TMP_DIR_INT+"/err", "a") as err_log:
-                subprocess.call(["tar", "-xf", pkg_abs], stderr=err_log)
-        elif fmt in ("tbz2", "xpak"):
-            # note: this needs tar that detects compression algo
-            subprocess.call(["tar", "-xf", pkg_abs])
-        os.chdir(ORIG_DIR)
+        if ARGS.plan:
+            cached = False
+            if ARGS.extract_cache:
+                cached = os.path.exists(ARGS.extract_cache+"/"+get_file_digest(pkg_abs)+"/tree")
+            
+            size = list_pkg(pkg_abs, fmt, kind, extr_dir)
+            PLAN_PKGS.append({"age":age, "kind":kind, "package":pkg_abs, "size":size, "cached":cached})
+            trace_span(os.path.basename(pkg), "list", start, "main", {"age":age, "kind":kind, "size":os.path.getsize(pkg_abs)})
+            continue
+        
+        if ARGS.extract_cache:
+            extract_cached(pkg_abs, fmt, extr_dir)
+        else:
+            extract_pkg(pkg_abs, fmt, extr_dir)
+        
+        trace_span(os.path.basename(pkg), "extract", start, "main", {"age":age, "kind":kind, "size":os.path.getsize(pkg_abs)})
+    
+    if item in WORKSPACE_ITEMS:
+        WORKSPACE_ITEMS[item] = get_tree_size(extr_dir)
     
     return extr_dir
 
+def extract_pkg(pkg_abs, fmt, extr_dir):
+    os.chdir(extr_dir)
+    if fmt=="rpm":
+        subprocess.call("rpm2cpio \""+pkg_abs+"\" | cpio -id --quiet", shell=True)
+    elif fmt=="deb":
+        subprocess.call(["dpkg-deb", "--extract", pkg_abs, "."])
+    elif fmt=="apk":
+        with open(TMP_DIR_INT+"/err", "a") as err_log:
+            subprocess.call(["tar", "-xf", pkg_abs], stderr=err_log)
+    elif fmt in ("tbz2", "xpak"):
+        # note: this needs tar that detects compression algo
+        subprocess.call(["tar", "-xf", pkg_abs])
+    os.chdir(ORIG_DIR)
+
+def read_pkg_members(pkg_abs, fmt):
+    proc = None
+    if fmt=="rpm":
+        proc = subprocess.Popen(["rpm2cpio", pkg_abs], stdout=subprocess.PIPE)
+        members = read_cpio(proc.stdout)
+    elif fmt=="deb":
+        proc = subprocess.Popen(["dpkg-deb", "--fsys-tarfile", pkg_abs], stdout=subprocess.PIPE)
+        members = read_tar(tarfile.open(fileobj=proc.stdout, mode="r|"))
+    elif fmt=="apk":
+        members = read_tar(tarfile.open(fileobj=gzip.GzipFile(pkg_abs), mode="r|", ignore_zeros=True))
+    else:
+        members = read_tar(tarfile.open(pkg_abs, mode="r|bz2"))
+    
+    return members, proc
+
+def list_pkg(pkg_abs, fmt, kind, extr_dir):
+    # ELF files of release packages are extracted to read their headers,
+    # other files are left as sparse files of the same size that keep
+    # the first bytes (magic) of the member
+    members, proc = read_pkg_members(pkg_abs, fmt)
+    
+    size = 0
+    try:
+        for name, fsize, read in members:
+            name = re.sub(r"\A(\./|/)+", "", name)
+            if not name or ".." in name.split("/"):
+                continue
+            
+            path = extr_dir+"/"+name
+            fdir = os.path.dirname(path)
+            if not os.path.exists(fdir):
+                os.makedirs(fdir)
+            
+            head = read(4)
+            if kind=="rel" and head=="\x7fELF":
+                write_file(path, head+read())
+            else:
+                with open(path, "w") as f:
+                    f.write(head)
+                    f.truncate(fsize)
+            
+            size += fsize
+    except (tarfile.TarError, IOError, EOFError, zlib.error):
+        # trailing data of tbz2/xpak packages
+        if fmt not in ["tbz2", "xpak"]:
+            exit_status("Error", "can't list files of package \'"+pkg_abs+"\'")
+    
+    if proc:
+        proc.stdout.close()
+        proc.wait()
+    
+    return size
+
+def read_cpio(f):
+    # "newc" archive of rpm2cpio
+    while True:
+        hdr = f.read(110)
+        if len(hdr)<110 or hdr[:6] not in ["070701", "070702"]:
+            break
+        
+        mode = int(hdr[14:22], 16)
+        nlink = int(hdr[38:46], 16)
+        size = int(hdr[54:62], 16)
+        name_size = int(hdr[94:102], 16)
+        
+        name = f.read(name_size)[:-1]
+        f.read((4-(110+name_size)%4)%4)
+        
+        if name=="TRAILER!!!":
+            break
+        
+        left = [size]
+        def read(n=-1):
+            if n<0 or n>left[0]:
+                n = left[0]
+            data = f.read(n)
+            left[0] -= len(data)
+            return data
+        
+        # data of hardlinked files comes with the last link only
+        if stat.S_ISREG(mode) and not (nlink>1 and size==0):
+            yield name, size, read
+        
+        while left[0]>0:
+            left[0] -= len(f.read(min(left[0], 1048576)))
+        
+        f.read((4-size%4)%4)
+
+def read_tar(tar):
+    for member in tar:
+        if member.isfile():
+            yield member.name, member.size, tar.extractfile(member).read
+
+def lock_file(path):
+    lock = open(path, "a")
+    fcntl.flock(lock, fcntl.LOCK_EX)
+    return lock
+
+def get_live_refs(entry):
+    # references of finished processes are left by killed runs
+    refs = []
+    for ref in os.listdir(entry+"/refs"):
+        try:
+            os.kill(int(ref), 0)
+        except OSError as e:
+            if e.errno==errno.ESRCH:
+                os.remove(entry+"/refs/"+ref)
+                continue
+        refs.append(ref)
+    
+    return refs
+
+def link_tree(src, dest):
+    with open(TMP_DIR_INT+"/err", "a") as err_log:
+        # hardlinks if on the same file system, reflinks or copies otherwise
+        if subprocess.call(["cp", "-a", "-l", "-f", src+"/.", dest], stderr=err_log)!=0:
+            subprocess.call(["cp", "-a", "-f", "--reflink=auto", src+"/.", dest], stderr=err_log)
+
+def extract_cached(pkg_abs, fmt, extr_dir):
+    cache = ARGS.extract_cache
+    entry = cache+"/"+get_file_digest(pkg_abs)
+    ref = entry+"/refs/"+str(os.getpid())
+    
+    # referenced entries are not evicted
+    lock = lock_file(cache+"/lock")
+    if not os.path.exists(entry+"/refs"):
+        os.makedirs(entry+"/refs")
+    write_file(ref, "")
+    lock.close()
+    
+    # the first run extracts the package, others wait for it
+    lock = lock_file(entry+"/lock")
+    if os.path.exists(entry+"/tree"):
+        print "Using cached extraction of "+os.path.basename(pkg_abs)
+    else:
+        tmp = entry+"/tree.tmp"
+        if os.path.exists(tmp):
+            chmod_777(tmp)
+            shutil.rmtree(tmp)
+        
+        os.makedirs(tmp)
+        extract_pkg(pkg_abs, fmt, tmp)
+        write_file(entry+"/size", str(get_tree_size(tmp)))
+        os.rename(tmp, entry+"/tree")
+    lock.close()
+    
+    link_tree(entry+"/tree", extr_dir)
+    
+    lock = lock_file(cache+"/lock")
+    os.remove(ref)
+    # last use time for LRU eviction
+    os.utime(entry+"/size", None)
+    lock.close()
+
+def evict_extract_cache():
+    cache = ARGS.extract_cache
+    
+    limit = parse_size(EXTRACT_CACHE_SIZE)
+    if ARGS.extract_cache_size:
+        limit = parse_size(ARGS.extract_cache_size)
+    
+    lock = lock_file(cache+"/lock")
+    
+    entries = []
+    total = 0
+    for name in os.listdir(cache):
+        entry = cache+"/"+name
+        if not os.path.exists(entry+"/size"):
+            continue
+        
+        size = int(read_file(entry+"/size"))
+        entries.append([os.path.getmtime(entry+"/size"), entry, size])
+        total += size
+    
+    evicted = []
+    for used, entry, size in sorted(entries):
+        if total<=limit:
+            break
+        
+        if get_live_refs(entry):
+            continue
+        
+        trash = entry+".removing."+str(os.getpid())
+        os.rename(entry, trash)
+        evicted.append(trash)
+        total -= size
+    
+    lock.close()
+    
+    if evicted:
+        print "Removed "+str(len(evicted))+" package(s) from the extraction cache"
+        for trash in evicted:
+            chmod_777(trash)
+            shutil.rmtree(trash)
+
+def get_staged_dir(tree, kind):
+    if kind=="debug" and os.path.isdir(tree+"/usr/lib/debug"):
+        return tree+"/usr/lib/debug"
+    
+    if kind=="devel":
+        return tree+"/usr/include"
+    
+    return tree
+
+def get_tree_size(path):
+    size = 0
+    for root, dirs, files in os.walk(path):
+        for f in dirs+files:
+            size += os.lstat(root+"/"+f).st_blocks*512
+    
+    return size
+
+def get_workspace_budget():
+    if ARGS.workspace_size:
+        return parse_size(ARGS.workspace_size)
+    
+    st = os.statvfs(ARGS.workspace)
+    budget = st.f_bavail*st.f_frsize
+    
+    mem = get_mem_available()
+    if mem:
+        budget = min(budget, mem/2)
+    
+    return budget
+
+def place_in_workspace(item, size):
+    if sum(WORKSPACE_ITEMS.values())+size>WORKSPACE_BUDGET:
+        return SPILL_DIR+"/"+item
+    
+    WORKSPACE_ITEMS[item] = size
+    return TMP_DIR_INT+"/"+item
+
+def settle_workspace(e_dir):
+    if not SPILL_DIR:
+        return
+    
+    # move the largest trees (usually debuginfo) to disk
+    while WORKSPACE_ITEMS and sum(WORKSPACE_ITEMS.values())>WORKSPACE_BUDGET:
+        item = max(WORKSPACE_ITEMS.keys(), key=lambda x: WORKSPACE_ITEMS[x])
+        print "Moving "+item+" ("+format_size(WORKSPACE_ITEMS[item])+") out of the workspace"
+        
+        src = TMP_DIR_INT+"/"+item
+        dest = SPILL_DIR+"/"+item
+        
+        if not os.path.exists(os.path.dirname(dest)):
+            os.makedirs(os.path.dirname(dest))
+        
+        # files are hardlinks to the extraction cache, their modes are kept
+        if ARGS.extract_cache:
+            chmod_dirs(src)
+        else:
+            chmod_777(src)
+        shutil.move(src, dest)
+        del WORKSPACE_ITEMS[item]
+        
+        for age in e_dir:
+            for kind in e_dir[age]:
+                if e_dir[age][kind]==src:
+                    e_dir[age][kind] = dest
+
 def get_rel_path(path):
     global TMP_DIR_INT
     path = path.replace(TMP_DIR_INT+"/", "")
+    if SPILL_DIR:
+        path = path.replace(SPILL_DIR+"/", "")
     path = re.sub(r"\Aext/(old|new)/(rel|debug|devel)/", "", path)
     return path
 
@@ -199,6 +709,100 @@ def is_object(path):
             return True
     return False
 
+def list_dir(path):
+    # types come with directory entries, no stat per file
+    if SCAN_DIR:
+        return [(e.name, e.is_dir(follow_symlinks=False), e.is_symlink()) for e in SCAN_DIR(path)]
+    
+    entries = []
+    for name in os.listdir(path):
+        mode = os.lstat(path+"/"+name).st_mode
+        entries.append((name, stat.S_ISDIR(mode), stat.S_ISLNK(mode)))
+    
+    return entries
+
+def discover_tree(age, kind, tree, found):
+    # only paths used later are kept, headers are counted
+    start = time.time()
+    objects = {}
+    debuginfo = {}
+    headers = 0
+    
+    skip = None
+    if age in STAGED and kind!="debug":
+        skip = get_staged_dir(STAGED[age], "debug")
+    
+    elf_debuginfo = False
+    if kind=="debug":
+        elf_debuginfo = age in STAGED or get_fmt(PKGS[age]["debug"].keys()[0])=="deb"
+    
+    dirs = [tree]
+    while dirs:
+        root = dirs.pop()
+        try:
+            entries = list_dir(root)
+        except OSError:
+            continue
+        
+        for name, is_dir, is_link in entries:
+            fpath = root+"/"+name
+            
+            if is_dir:
+                if fpath!=skip:
+                    dirs.append(fpath)
+                continue
+            
+            if is_link:
+                continue
+            
+            if kind=="rel":
+                if is_object(fpath):
+                    objects[fpath] = 1
+            elif kind=="debug":
+                if name.endswith(".debug") or (elf_debuginfo and is_object(fpath)):
+                    debuginfo[fpath] = os.path.getsize(fpath)
+            elif kind=="devel":
+                if fpath.find("/include/")!=-1 or is_header(name):
+                    headers += 1
+    
+    found[(age, kind)] = [objects, debuginfo, headers]
+    
+    trace_span(age+"/"+kind, "discover", start, "discover "+age+"/"+kind, {"tree":tree, "objects":len(objects), "debuginfo":len(debuginfo), "headers":headers})
+
+def discover_files(e_dir):
+    # walking is mostly waiting for directory reads, trees are walked together
+    found = {}
+    threads = []
+    for age in AGES:
+        for kind in e_dir[age]:
+            t = threading.Thread(target=discover_tree, args=(age, kind, e_dir[age][kind], found))
+            t.start()
+            threads.append(t)
+    
+    for t in threads:
+        # short joins let signals through
+        while t.is_alive():
+            t.join(1)
+    
+    for age in AGES:
+        for kind in e_dir[age]:
+            if (age, kind) not in found:
+                exit_status("Error", "can't read files in "+e_dir[age][kind])
+            
+            objects, debuginfo, headers = found[(age, kind)]
+            
+            if objects:
+                if "object" not in FILES[age]:
+                    FILES[age]["object"] = {}
+                FILES[age]["object"].update(objects)
+            
+            if debuginfo:
+                if "debuginfo" not in FILES[age]:
+                    FILES[age]["debuginfo"] = {}
+                FILES[age]["debuginfo"].update(debuginfo)
+            
+            HEADERS[age] += headers
+
 def is_header(name):
     if re.search(r"\.(h|hh|hp|hxx|hpp|h\+\+|tcc)\Z", name):
         return True
@@ -212,20 +816,156 @@ def get_fmt(path):
     
     return None
 
+def get_pkg_digest(path):
+    # reading whole packages is too slow, the size and both ends
+    # of the file identify it (RPM/DEB headers are at the start), mtime
+    # and inode tell apart rebuilds differing only in the middle
+    digest = hashlib.sha1()
+    st = os.stat(path)
+    size = st.st_size
+    digest.update(str(size)+":"+str(st.st_mtime)+":"+str(st.st_ino))
+    with open(path, "rb") as f:
+        digest.update(f.read(PKG_DIGEST_BLOCK))
+        if size>PKG_DIGEST_BLOCK:
+            f.seek(max(PKG_DIGEST_BLOCK, size-PKG_DIGEST_BLOCK))
+            digest.update(f.read(PKG_DIGEST_BLOCK))
+    
+    return digest.hexdigest()
+
+def read_rpm_header(path):
+    tags = {}
+    with open(path, "rb") as f:
+        if f.read(96)[:4]!="\xed\xab\xee\xdb":
+            return None
+        
+        # signature header goes first and is padded to 8 bytes
+        for hdr in ["signature", "main"]:
+            intro = f.read(16)
+            if len(intro)<16 or intro[:3]!="\x8e\xad\xe8":
+                return None
+            
+            nindex, hsize = struct.unpack(">II", intro[8:16])
+            index = f.read(16*nindex)
+            store = f.read(hsize)
+            
+            if hdr=="signature":
+                f.read((8-hsize%8)%8)
+                continue
+            
+            for i in range(0, nindex):
+                tag, ttype, offset, count = struct.unpack(">iiii", index[16*i:16*i+16])
+                # STRING or I18NSTRING
+                if tag in RPM_TAGS and ttype in [6, 9]:
+                    tags[RPM_TAGS[tag]] = store[offset:store.find("\0", offset)]
+    
+    return tags
+
+def decompress(data, ext):
+    if ext==".xz":
+        try:
+            import lzma
+            return lzma.decompress(data)
+        except ImportError:
+            pass
+    
+    prog = {".xz":"xz", ".zst":"zstd"}
+    if ext not in prog or not check_cmd(prog[ext]):
+        return None
+    
+    proc = subprocess.Popen([prog[ext], "-dc"], stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+    out = proc.communicate(data)[0]
+    if proc.returncode!=0:
+        return None
+    
+    return out
+
+def read_deb_control(path):
+    data = None
+    with open(path, "rb") as f:
+        if f.read(8)!="!<arch>\n":
+            return None
+        
+        while True:
+            member = f.read(60)
+            if len(member)<60:
+                return None
+            
+            name = member[:16].strip().rstrip("/")
+            size = int(member[48:58])
+            
+            if name.startswith("control.tar"):
+                data = f.read(size)
+                break
+            
+            # members are aligned to 2 bytes
+            f.seek(size+size%2, 1)
+    
+    ext = name[len("control.tar"):]
+    if ext in ["", ".gz", ".bz2"]:
+        mode = "r:"+ext[1:]
+    else:
+        data = decompress(data, ext)
+        mode = "r:"
+    
+    if data is None:
+        return None
+    
+    tar = tarfile.open(fileobj=io.BytesIO(data), mode=mode)
+    for member in tar.getmembers():
+        if member.name in ["./control", "control"]:
+            return tar.extractfile(member).read()
+    
+    return None
+
+def read_apk_info(path):
+    # signature, control and data parts are concatenated gzip streams
+    try:
+        tar = tarfile.open(fileobj=gzip.GzipFile(path), mode="r|", ignore_zeros=True)
+        for member in tar:
+            if member.name==".PKGINFO":
+                return tar.extractfile(member).read()
+    except (IOError, EOFError, zlib.error, tarfile.TarError):
+        return None
+    
+    return None
+
 def get_attrs(path):
+    key = get_pkg_digest(path)
+    if key not in PKG_ATTRS:
+        attrs = read_attrs(path)
+        if not attrs:
+            return None
+        PKG_ATTRS[key] = attrs
+    
+    return PKG_ATTRS[key]
+
+def read_attrs(path):
     fmt = get_fmt(path)
     
     name = None
     ver = None
-    rl = None
     arch = None
     
     if fmt=="rpm":
-        r = subprocess.check_output(["rpm", "-qp", "--queryformat", "%{name},%{version},%{release},%{arch}", path])
-        name, ver, rl, arch = r.split(",")
-        ver = ver+"-"+rl
+        tags = read_rpm_header(path)
+        
+        # the header may lack some of the tags
+        if tags is not None and ("version" not in tags or "release" not in tags):
+            tags = None
+        
+        if tags is None and check_cmd("rpm"):
+            r = subprocess.check_output(["rpm", "-qp", "--queryformat", "%{name},%{version},%{release},%{arch}", path])
+            tags = dict(zip(["name", "version", "release", "arch"], r.split(",")))
+        
+        if tags:
+            name = tags.get("name")
+            ver = tags.get("version")+"-"+tags.get("release")
+            arch = tags.get("arch")
     elif fmt=="deb":
-        r = subprocess.check_output(["dpkg", "-f", path])
+        r = read_deb_control(path)
+        if r is None:
+            r = subprocess.check_output(["dpkg-deb", "-f", path])
+        
         attr = {"Package":None, "Version":None, "Architecture":None}
         for line in r.split("\n"):
             m = re.match(r"(\w+)\s*:\s*(.+)", line)
@@ -236,8 +976,14 @@ def get_attrs(path):
         ver = attr["Version"]
         arch = attr["Architecture"]
     elif fmt=="apk":
-        with open(TMP_DIR_INT+"/err", "a") as err_log:
-            r = subprocess.check_output(["tar", "-xf", path, ".PKGINFO", "-O"], stderr=err_log)
+        r = read_apk_info(path)
+        if r is None:
+            with open(TMP_DIR_INT+"/err", "a") as err_log:
+                try:
+                    r = subprocess.check_output(["tar", "-xf", path, ".PKGINFO", "-O"], stderr=err_log)
+                except subprocess.CalledProcessError:
+                    # broken package
+                    r = ""
         
         attr = {}
         
@@ -246,9 +992,9 @@ def get_attrs(path):
             if m:
                 attr[m.group(1)] = m.group(2)
         
-        name = attr["pkgname"]
-        ver = attr["pkgver"]
-        arch = attr["arch"]
+        name = attr.get("pkgname")
+        ver = attr.get("pkgver")
+        arch = attr.get("arch")
     elif fmt in ("tbz2", "xpak"):
         # no command-line tools to extract that metadata
         import portage.versions
@@ -267,7 +1013,10 @@ def get_attrs(path):
     return None
 
 def get_soname(path):
+    start = time.time()
     r = subprocess.check_output(["objdump", "-p", path])
+    trace_span(os.path.basename(path), "get_soname", start, "main", {"path":path, "size":os.path.getsize(path)})
+    
     m = re.search(r"SONAME\s+([^ ]+)", r)
     if m:
         return m.group(1).rstrip()
@@ -282,7 +1031,7 @@ def get_short_name(obj):
     return None
 
 def get_shortest_name(obj):
-    m = re.match(r"\A([^\d\.]+)", obj)
+    m = re.match(r"\A((?:.*/)?[^\d\./]+)", obj)
     if m:
         return m.group(1)
     
@@ -325,6 +1074,156 @@ def read_stat(path, rdir):
     
     return stat
 
+def get_report_dir(default):
+    if ARGS.report_dir:
+        return ARGS.report_dir
+    
+    report_dir = default
+    report_dir += "/"+PKGS_ATTR["old"]["arch"]+"/"+PKGS_ATTR["old"]["name"]
+    report_dir += "/"+PKGS_ATTR["old"]["ver"]+"/"+PKGS_ATTR["new"]["ver"]
+    return report_dir
+
+def init_report_dir(default):
+    report_dir = get_report_dir(default)
+    
+    if os.path.exists(report_dir):
+        if ARGS.rebuild_report:
+            if os.path.exists(report_dir+"/index.html"):
+                os.remove(report_dir+"/index.html")
+        else:
+            exit_status("Ok", "The report already exists: "+report_dir)
+    else:
+        os.makedirs(report_dir)
+    
+    return report_dir
+
+def open_reports_index():
+    path = REPORTS_INDEX
+    if ARGS.reports_index:
+        path = ARGS.reports_index
+    
+    idir = os.path.dirname(path)
+    if idir and not os.path.exists(idir):
+        os.makedirs(idir)
+    
+    conn = sqlite3.connect(path, timeout=600)
+    
+    cols = []
+    for col in REPORTS_INDEX_COLS:
+        if col=="path":
+            cols.append("path TEXT PRIMARY KEY")
+        elif col in ["kind", "arch", "name", "old_version", "new_version"]:
+            cols.append(col+" TEXT")
+        elif col in ["bc", "bc_effective", "sc", "created"]:
+            cols.append(col+" REAL")
+        else:
+            cols.append(col+" INTEGER")
+    
+    conn.execute("CREATE TABLE IF NOT EXISTS reports ("+", ".join(cols)+")")
+    conn.execute("CREATE INDEX IF NOT EXISTS reports_name ON reports (name, arch)")
+    conn.execute("CREATE INDEX IF NOT EXISTS reports_created ON reports (created)")
+    
+    return conn
+
+def add_to_index(conn, report_dir, kind, old, new, meta, created):
+    row = {}
+    row["path"] = os.path.abspath(report_dir)
+    row["kind"] = kind
+    row["arch"] = old["arch"]
+    row["name"] = old["name"]
+    row["old_version"] = old["ver"]
+    row["new_version"] = new["ver"]
+    row["bc"] = meta.get("BC")
+    row["bc_effective"] = meta.get("BC_Effective")
+    row["sc"] = meta.get("Source_BC")
+    row["added"] = meta.get("Added")
+    row["removed"] = meta.get("Removed")
+    row["problems"] = meta.get("TotalProblems")
+    row["src_problems"] = meta.get("Source_TotalProblems")
+    row["objects_added"] = meta.get("ObjectsAdded")
+    row["objects_removed"] = meta.get("ObjectsRemoved")
+    row["changed_soname"] = meta.get("ChangedSoname")
+    row["objects_failed"] = len(meta.get("ObjectsFailed", {}))
+    row["created"] = created
+    
+    values = [row[col] for col in REPORTS_INDEX_COLS]
+    conn.execute("INSERT OR REPLACE INTO reports ("+", ".join(REPORTS_INDEX_COLS)+") VALUES ("+", ".join(["?"]*len(values))+")", values)
+
+def update_reports_index(report_dir, kind, meta):
+    conn = open_reports_index()
+    with conn:
+        add_to_index(conn, report_dir, kind, PKGS_ATTR["old"], PKGS_ATTR["new"], meta, time.time())
+    conn.close()
+
+def reindex_reports(top):
+    if not os.path.isdir(top):
+        exit_status("Error", "can't access \'"+top+"\'")
+    
+    # compat_report/<arch>/<name>/<v1>/<v2>/meta.json
+    found = []
+    for root, dirs, files in os.walk(top):
+        if "meta.json" not in files:
+            continue
+        
+        # per-object report directories have no meta.json
+        del dirs[:]
+        
+        try:
+            meta = json.loads(read_file(root+"/meta.json"))
+        except ValueError:
+            print "WARNING: broken "+root+"/meta.json"
+            continue
+        
+        if os.path.exists(root+"/report.json"):
+            rep = json.loads(read_file(root+"/report.json"))
+            old = {"name":rep["Old"]["Name"], "ver":rep["Old"]["Version"], "arch":rep["Old"]["Arch"]}
+            new = {"name":rep["New"]["Name"], "ver":rep["New"]["Version"], "arch":rep["New"]["Arch"]}
+        else:
+            parts = os.path.relpath(root, top).split(os.sep)
+            if len(parts)<4:
+                print "WARNING: can't identify the report "+root
+                continue
+            old = {"arch":parts[-4], "name":parts[-3], "ver":parts[-2]}
+            new = {"arch":parts[-4], "name":parts[-3], "ver":parts[-1]}
+        
+        kind = "full"
+        if "BC" not in meta and "Source_BC" not in meta:
+            kind = "quick"
+        
+        found.append([root, kind, old, new, meta, os.path.getmtime(root+"/meta.json")])
+    
+    conn = open_reports_index()
+    with conn:
+        for r in found:
+            add_to_index(conn, *r)
+    conn.close()
+    
+    print "Indexed "+str(len(found))+" report(s)"
+
+def query_reports(cond):
+    conn = open_reports_index()
+    
+    try:
+        cur = conn.execute("SELECT "+", ".join(REPORTS_INDEX_COLS)+" FROM reports WHERE "+cond+" ORDER BY name, arch, created")
+    except sqlite3.Error as e:
+        exit_status("Error", "invalid query: "+str(e))
+    
+    print "\t".join(REPORTS_INDEX_COLS)
+    for row in cur:
+        res = []
+        for col, val in zip(REPORTS_INDEX_COLS, row):
+            if val is None:
+                res.append("-")
+            elif col=="created":
+                res.append(time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(val)))
+            elif type(val) is float:
+                res.append(format_num(val))
+            else:
+                res.append(str(val))
+        print "\t".join(res)
+    
+    conn.close()
+
 def compose_html_head(title, keywords, description):
     styles = read_file(MOD_DIR+"/Internals/Styles/Report.css")
     
@@ -347,19 +1246,129 @@ def compose_html_head(title, keywords, description):
     
     return cnt
 
-def get_bc_class(rate, total):
-    cclass = "ok"
-    if float(rate)==100:
-        if total:
-            cclass = "warning"
-    else:
-        if float(rate)>=90:
-            cclass = "warning"
-        elif float(rate)>=80:
-            cclass = "almost_compatible"
-        else:
-            cclass = "incompatible"
-    
+def compose_test_info(subject, note):
+    n1 = PKGS_ATTR["old"]["name"]
+    n2 = PKGS_ATTR["new"]["name"]
+    
+    v1 = PKGS_ATTR["old"]["ver"]
+    v2 = PKGS_ATTR["new"]["ver"]
+    
+    arch = PKGS_ATTR["old"]["arch"]
+    
+    report = "<h1>ABI report"
+    if n1==n2:
+        title = n1+": API/ABI report between "+v1+" and "+v2+" versions"
+        keywords = n1+", API, ABI, changes, compatibility, report"
+        desc = "API/ABI compatibility report between "+v1+" and "+v2+" versions of the "+n1
+        report += " for "+n1+": <u>"+v1+"</u> vs <u>"+v2+"</u>"
+    else:
+        title = "API/ABI report between "+n1+"-"+v1+" and "+n2+"-"+v2+" packages"
+        keywords = n1+", "+n2+", API, ABI, changes, compatibility, report"
+        desc = "API/ABI compatibility report between "+n1+"-"+v1+" and "+n2+"-"+v2+" packages"
+        report += " for <u>"+n1+"-"+v1+"</u> vs <u>"+n2+"-"+v2+"</u>"
+    
+    if note:
+        report += " ("+note+")"
+    
+    report += "</h1>\n"
+    
+    report += "<h2>Test Info</h2>\n"
+    report += "<table class='summary'>\n"
+    report += "<tr>\n"
+    report += "<th class='left'>Package</th><td class='right'>"+n1+"</td>\n"
+    report += "</tr>\n"
+    report += "<tr>\n"
+    report += "<th class='left'>Old Version</th><td class='right'>"+v1+"</td>\n"
+    report += "</tr>\n"
+    report += "<tr>\n"
+    report += "<th class='left'>New Version</th><td class='right'>"+v2+"</td>\n"
+    report += "</tr>\n"
+    report += "<tr>\n"
+    report += "<th class='left'>Arch</th><td class='right'>"+arch+"</td>\n"
+    report += "</tr>\n"
+    report += "<tr>\n"
+    report += "<th class='left'>Subject</th><td class='right'>"+subject+"</td>\n"
+    report += "</tr>\n"
+    report += "</table>\n"
+    
+    return title, keywords, desc, report
+
+def compose_footer():
+    cnt = "<br/>\n"
+    cnt += "<br/>\n"
+    
+    cnt += "<hr/>\n"
+    cnt += "<div class='footer' align='right'><i>Generated by <a href='https://github.com/lvc/pkg-abidiff'>Package ABI Diff</a> "+TOOL_VERSION+" &#160;</i></div>\n"
+    cnt += "<br/>\n"
+    
+    return cnt
+
+def compose_row_start(name, values):
+    # values are used by Table.js to sort rows
+    cnt = "<tr data-name='"+name+"'"
+    for key in ["bc", "sc", "added", "removed", "changed_version", "symbols"]:
+        if key in values:
+            cnt += " data-"+key+"='"+str(values[key])+"'"
+    cnt += ">\n"
+    
+    return cnt
+
+def compose_table_script(table_id):
+    cnt = "<div id='"+table_id+"_pages'></div>\n"
+    cnt += "<script type=\"text/javascript\">\n"
+    cnt += read_file(MOD_DIR+"/Internals/Scripts/Table.js")
+    cnt += "initTable('"+table_id+"');\n"
+    cnt += "</script>\n"
+    
+    return cnt
+
+def write_meta(path, meta):
+    write_file(path, json.dumps(meta, indent=2, separators=(",", ": "))+"\n")
+
+def get_pkg_info(age):
+    info = collections.OrderedDict()
+    info["Name"] = PKGS_ATTR[age]["name"]
+    info["Version"] = PKGS_ATTR[age]["ver"]
+    info["Arch"] = PKGS_ATTR[age]["arch"]
+    return info
+
+def open_json_report(path, meta):
+    # aggregates go first, objects are appended one by one
+    f = open(path, "w")
+    f.write("{\n")
+    f.write("  \"ToolVersion\": "+json.dumps(TOOL_VERSION)+",\n")
+    f.write("  \"Old\": "+json.dumps(get_pkg_info("old"))+",\n")
+    f.write("  \"New\": "+json.dumps(get_pkg_info("new"))+",\n")
+    for key in meta:
+        f.write("  "+json.dumps(key)+": "+json.dumps(meta[key], sort_keys=True)+",\n")
+    f.write("  \"Objects\": [")
+    return {"file":f, "count":0}
+
+def write_json_item(report, item):
+    if report["count"]:
+        report["file"].write(",")
+    report["file"].write("\n    "+json.dumps(item, sort_keys=True))
+    report["count"] += 1
+
+def close_json_report(report):
+    if report["count"]:
+        report["file"].write("\n  ")
+    report["file"].write("]\n}\n")
+    report["file"].close()
+
+def get_bc_class(rate, total):
+    cclass = "ok"
+    if float(rate)==100:
+        if total:
+            cclass = "warning"
+    else:
+        if float(rate)>=90:
+            cclass = "warning"
+        elif float(rate)>=80:
+            cclass = "almost_compatible"
+        else:
+            cclass = "incompatible"
+    
     return cclass
 
 def format_num(num):
@@ -368,69 +1377,2470 @@ def format_num(num):
     num = re.sub(r"\A(\d+)\.0\Z", r"\1", num)
     return num
 
-def get_dumpversion(prog):
-    ver = subprocess.check_output([prog, "-dumpversion"])
-    return ver.rstrip()
+def get_dumpversion(prog):
+    return get_tool_version(prog, "-dumpversion")
+
+def get_version(prog):
+    return get_tool_version(prog, "--version")
+
+def get_tool_version(prog, opt):
+    cache_path = get_dumps_dir()+"/"+TOOLS_CACHE
+    if not TOOLS:
+        TOOLS.update(load_json(cache_path))
+    
+    # the same executable reports the same version
+    path = os.path.realpath(check_cmd(prog))
+    st = os.stat(path)
+    key = path+" "+opt
+    
+    if key in TOOLS:
+        tool = TOOLS[key]
+        if tool["size"]==st.st_size and tool["mtime"]==st.st_mtime:
+            return tool["version"]
+    
+    ver = subprocess.check_output([prog, opt]).rstrip()
+    TOOLS[key] = {"size":st.st_size, "mtime":st.st_mtime, "version":ver}
+    save_json(cache_path, TOOLS)
+    
+    return ver
+
+def cmp_vers(x, y):
+    xp = x.split(".")
+    yp = y.split(".")
+    
+    for k in range(len(xp), max(len(xp), len(yp))):
+        xp.append("0")
+    
+    for k in range(len(yp), max(len(xp), len(yp))):
+        yp.append("0")
+    
+    for k in range(0, len(xp)):
+        a = xp[k]
+        b = yp[k]
+        
+        if a==b:
+            continue
+        
+        if(int(a) > int(b)):
+            return 1
+        else:
+            return -1
+    
+    return 0
+
+def get_file_digest(path):
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        while True:
+            data = f.read(1048576)
+            if not data:
+                break
+            digest.update(data)
+    
+    return digest.hexdigest()
+
+def find_same_objects(paths):
+    # only files of equal size can be identical
+    by_size = {}
+    for path in paths:
+        size = os.path.getsize(path)
+        if size not in by_size:
+            by_size[size] = []
+        by_size[size].append(path)
+    
+    same = {}
+    for size in by_size:
+        if len(by_size[size])<2:
+            continue
+        
+        by_digest = {}
+        for path in by_size[size]:
+            digest = get_file_digest(path)
+            if digest not in by_digest:
+                by_digest[digest] = []
+            by_digest[digest].append(path)
+        
+        for digest in by_digest:
+            # prefer the shortest file name, e.g. libfoo.so.1 over libfoo-compat.so.1
+            copies = sorted(by_digest[digest], key=lambda x: (len(os.path.basename(x)), x))
+            for path in copies[1:]:
+                same[path] = copies[0]
+    
+    return same
+
+def find_objects(e_dir):
+    same = {}
+    for age in ["old", "new"]:
+        OBJECTS[age] = {}
+        SAME_OBJECT[age] = {}
+        DYNSYM[age] = {}
+        
+        if "object" in FILES[age]:
+            same[age] = find_same_objects(FILES[age]["object"].keys())
+    
+    for age in sorted(same.keys(), reverse=True):
+        # objects are named by file name or by path if file names collide
+        # in the package, so -dump and comparisons use the same names
+        collide = {}
+        names = {}
+        for path in FILES[age]["object"]:
+            if path in same[age]:
+                continue
+            
+            name = os.path.basename(path)
+            if name in names:
+                collide[name] = 1
+            names[name] = 1
+        
+        # copies are named after representatives
+        paths = [path for path in FILES[age]["object"] if path not in same[age]]
+        paths.extend(sorted(same[age].keys()))
+        
+        names = {}
+        for path in paths:
+            name = os.path.basename(path)
+            if name in collide or name in OBJECTS[age]:
+                name = os.path.relpath(path, e_dir[age]["rel"])
+            OBJECTS[age][name] = path
+            names[path] = name
+        
+        for path in same[age]:
+            SAME_OBJECT[age][names[path]] = names[same[age][path]]
+        
+        if same[age]:
+            print "Found "+str(len(same[age]))+" duplicate object(s) in "+age+" release package"
+
+def get_log_name(name):
+    return name.replace("/", "_")
+
+def get_debuginfo_size(age, oname):
+    size = 0
+    debuginfo = FILES[age]["debuginfo"]
+    for path in debuginfo:
+        if os.path.basename(path).startswith(os.path.basename(oname)):
+            size += debuginfo[path]
+    
+    if not size:
+        # separated by build-id, take an average
+        size = sum(debuginfo.values())
+        size /= max(1, len(FILES[age]["object"]))
+    
+    return size
+
+def get_reverse(names):
+    names_r = {}
+    for obj in names:
+        name = names[obj]
+        if name not in names_r:
+            names_r[name] = {}
+        names_r[name][obj] = 1
+    
+    return names_r
+
+def get_object_dynsym(age, oname):
+    # readelf runs once per object, whatever the number of pairs
+    if oname not in DYNSYM[age]:
+        if oname in SAME_OBJECT[age]:
+            DYNSYM[age][oname] = get_object_dynsym(age, SAME_OBJECT[age][oname])
+        else:
+            DYNSYM[age][oname] = get_dynsym(OBJECTS[age][oname])
+    
+    return DYNSYM[age][oname]
+
+def get_minhash_coefs():
+    coefs = []
+    for i in range(0, MINHASH_BANDS*MINHASH_ROWS):
+        coef = int(hashlib.md5(str(i)).hexdigest()[:16], 16)
+        coefs.append([(coef>>32)|1, coef & 0xffffffff])
+    
+    return coefs
+
+def get_minhash(symbols, coefs):
+    hashes = [binascii.crc32(sym) & 0xffffffff for sym in symbols]
+    
+    sig = []
+    for a, b in coefs:
+        sig.append(min([(a*h+b) % MINHASH_PRIME for h in hashes]))
+    
+    return sig
+
+def match_by_symbols(removed, added):
+    # readelf is required with -quick only
+    if not check_cmd("readelf"):
+        print "WARNING: can't find readelf, objects are not matched by exported symbols"
+        return {}
+    
+    # objects with similar exported symbols share an LSH bucket
+    # of MinHash signature bands, only those are compared
+    coefs = get_minhash_coefs()
+    symbols = {}
+    buckets = {}
+    for age, objects in [("old", removed), ("new", added)]:
+        symbols[age] = {}
+        for obj in objects:
+            syms = get_object_dynsym(age, obj)
+            if not syms:
+                continue
+            
+            symbols[age][obj] = syms
+            sig = get_minhash(syms.keys(), coefs)
+            
+            for band in range(0, MINHASH_BANDS):
+                key = (band,)+tuple(sig[band*MINHASH_ROWS:(band+1)*MINHASH_ROWS])
+                if key not in buckets:
+                    buckets[key] = {"old":{}, "new":{}}
+                buckets[key][age][obj] = 1
+    
+    candidates = {}
+    for key in buckets:
+        for obj in buckets[key]["old"]:
+            for new_obj in buckets[key]["new"]:
+                candidates[(obj, new_obj)] = 1
+    
+    similar = []
+    for obj, new_obj in candidates:
+        syms1 = symbols["old"][obj]
+        syms2 = symbols["new"][new_obj]
+        common = len([sym for sym in syms1 if sym in syms2])
+        sim = float(common)/(len(syms1)+len(syms2)-common)
+        if sim>=MIN_SIMILARITY:
+            similar.append([sim, obj, new_obj])
+    
+    similar.sort(key=lambda x: (-x[0], x[1].lower(), x[2].lower()))
+    
+    matched = {}
+    matched_r = {}
+    for sim, obj, new_obj in similar:
+        if obj in matched or new_obj in matched_r:
+            continue
+        matched[obj] = [new_obj, sim]
+        matched_r[new_obj] = obj
+    
+    return matched
+
+def match_objects(old_objects, new_objects, soname, short_name, shortest_name):
+    soname_r = get_reverse(soname["new"])
+    short_name_r = get_reverse(short_name["new"])
+    shortest_name_r = get_reverse(shortest_name["new"])
+    
+    mapped = {}
+    mapped_r = {}
+    removed = {}
+    renamed_object = {}
+    match_reason = {}
+    
+    for obj in old_objects:
+        new_obj = None
+        
+        # match by SONAME
+        if obj in soname["old"]:
+            sname = soname["old"][obj]
+            if sname in soname_r:
+                bysoname = soname_r[sname].keys()
+                if bysoname and len(bysoname)==1:
+                    new_obj = bysoname[0]
+                    match_reason[obj] = "SONAME"
+        
+        # match by name
+        if new_obj is None:
+            if obj in new_objects:
+                new_obj = obj
+                match_reason[obj] = "name"
+        
+        # match by short name
+        if new_obj is None:
+            if obj in short_name["old"]:
+                shname = short_name["old"][obj]
+                if shname in short_name_r:
+                    byshort = short_name_r[shname].keys()
+                    if byshort and len(byshort)==1:
+                        new_obj = byshort[0]
+                        match_reason[obj] = "short name"
+        
+        # match by shortest name
+        if new_obj is None:
+            if obj in shortest_name["old"]:
+                shname = shortest_name["old"][obj]
+                if shname in shortest_name_r:
+                    byshort = shortest_name_r[shname].keys()
+                    if byshort and len(byshort)==1:
+                        new_obj = byshort[0]
+                        match_reason[obj] = "shortest name"
+        
+        if new_obj is None:
+            removed[obj] = 1
+            continue
+        
+        mapped[obj] = new_obj
+        mapped_r[new_obj] = obj
+    
+    added = {}
+    for obj in new_objects:
+        if obj not in mapped_r:
+            added[obj] = 1
+    
+    # match by exported symbols
+    if removed and added:
+        matched = match_by_symbols(removed, added)
+        for obj in matched:
+            new_obj, sim = matched[obj]
+            
+            mapped[obj] = new_obj
+            renamed_object[obj] = new_obj
+            match_reason[obj] = "symbols ("+format_num(100*sim)+"% in common)"
+            
+            removed.pop(obj, None)
+            added.pop(new_obj, None)
+    
+    # one object
+    if not mapped:
+        if len(old_objects)==1 and len(new_objects)==1:
+            obj = old_objects[0]
+            new_obj = new_objects[0]
+            
+            mapped[obj] = new_obj
+            renamed_object[obj] = new_obj
+            match_reason[obj] = "single object"
+            
+            removed.pop(obj, None)
+            added.pop(new_obj, None)
+    
+    return mapped, removed, added, renamed_object, match_reason
+
+def get_changed_soname(mapped, soname):
+    changed_soname = {}
+    for obj in mapped:
+        new_obj = mapped[obj]
+        
+        old_soname = soname["old"][obj]
+        new_soname = soname["new"][new_obj]
+        
+        if old_soname and new_soname and old_soname!=new_soname:
+            changed_soname[obj] = new_soname
+    
+    return changed_soname
+
+def get_cmp_job(obj, new_obj, abi_dump, report_dir, mem_limit):
+    obj_report_dir = report_dir+"/"+obj
+    
+    if os.path.exists(obj_report_dir):
+        shutil.rmtree(obj_report_dir)
+    
+    bin_report = obj_report_dir+"/abi_compat_report.html"
+    src_report = obj_report_dir+"/src_compat_report.html"
+    
+    cmd_c = [ABI_CC, "-l", obj, "-component", "object"]
+    
+    if ARGS.bin:
+        cmd_c.append("-bin")
+        cmd_c.extend(["-bin-report-path", bin_report])
+    if ARGS.src:
+        cmd_c.append("-src")
+        cmd_c.extend(["-src-report-path", src_report])
+    
+    cmd_c.append("-old")
+    cmd_c.append(abi_dump["old"][obj])
+    
+    cmd_c.append("-new")
+    cmd_c.append(abi_dump["new"][new_obj])
+    
+    dumps_size = os.path.getsize(abi_dump["old"][obj])+os.path.getsize(abi_dump["new"][new_obj])
+    
+    job = {}
+    job["name"] = obj
+    job["msg"] = "Comparing "+obj+" (old) and "+new_obj+" (new)"
+    job["cmd"] = cmd_c
+    job["log"] = TMP_DIR_INT+"/log_cmp_"+get_log_name(obj)
+    job["mem"] = DUMP_MEM_BASE+CMP_MEM_RATIO*dumps_size
+    job["mem_limit"] = mem_limit
+    job["object"] = obj
+    job["old_dump"] = abi_dump["old"][obj]
+    job["args"] = {"object":obj, "new_object":new_obj, "dumps_size":dumps_size}
+    job["bin_report"] = bin_report
+    job["src_report"] = src_report
+    job["outputs"] = [bin_report, src_report]
+    
+    return job
+
+def read_cmp_job(job, report_dir, compat, failed):
+    obj = job["object"]
+    bin_report = job["bin_report"]
+    src_report = job["src_report"]
+    
+    if job["killed"]:
+        failed[obj] = "abi-compliance-checker: "+job["killed"]
+        shutil.rmtree(report_dir+"/"+obj, ignore_errors=True)
+        return
+    
+    if ARGS.bin:
+        if not os.path.exists(bin_report):
+            print_err("ERROR: failed to create BC report for object "+obj)
+            return
+    
+    if ARGS.src:
+        if not os.path.exists(src_report):
+            print_err("ERROR: failed to create SC report for object "+obj)
+            return
+    
+    read_reports(obj, report_dir, compat)
+    write_cmp_key(report_dir+"/"+obj, job["key"])
+    
+    res = []
+    
+    if ARGS.bin:
+        res.append("BC: "+format_num(100-float(compat[obj]["bin"]["affected"]))+"%")
+    
+    if ARGS.src:
+        res.append("SC: "+format_num(100-float(compat[obj]["src"]["affected"]))+"%")
+    
+    print obj+": "+", ".join(res)
+
+def read_reports(obj, report_dir, compat):
+    obj_report_dir = report_dir+"/"+obj
+    
+    reports = {}
+    if ARGS.bin:
+        reports["bin"] = obj_report_dir+"/abi_compat_report.html"
+    if ARGS.src:
+        reports["src"] = obj_report_dir+"/src_compat_report.html"
+    
+    for kind in reports:
+        if not os.path.exists(reports[kind]):
+            return False
+    
+    compat[obj] = {}
+    for kind in reports:
+        compat[obj][kind] = read_stat(reports[kind], report_dir)
+    
+    return True
+
+def get_cmp_key(new_obj, old_dump, new_dump):
+    # everything the per-object report depends on
+    key = {}
+    key["old"] = get_dump_digest(old_dump)
+    key["new"] = get_dump_digest(new_dump)
+    key["old_ver"] = PKGS_ATTR["old"]["ver"]
+    key["new_ver"] = PKGS_ATTR["new"]["ver"]
+    key["new_object"] = new_obj
+    key["bin"] = ARGS.bin
+    key["src"] = ARGS.src
+    key["checker"] = ABI_CC_CUR_VER
+    return key
+
+def read_cmp_key(obj_report_dir):
+    key_path = obj_report_dir+"/inputs.json"
+    if not os.path.exists(key_path):
+        return None
+    
+    try:
+        return json.loads(read_file(key_path))
+    except ValueError:
+        return None
+
+def write_cmp_key(obj_report_dir, key):
+    write_file(obj_report_dir+"/inputs.json", json.dumps(key, sort_keys=True)+"\n")
+
+def get_dump_digest(path):
+    return get_dump_index(path)["digest"]
+
+def write_identical_reports(obj, report_dir, compat):
+    print obj+": identical ABI dumps, skipping comparison"
+    
+    obj_report_dir = report_dir+"/"+obj
+    
+    if os.path.exists(obj_report_dir):
+        shutil.rmtree(obj_report_dir)
+    
+    os.makedirs(obj_report_dir)
+    
+    reports = {}
+    if ARGS.bin:
+        reports["bin"] = ["binary", obj_report_dir+"/abi_compat_report.html"]
+    if ARGS.src:
+        reports["src"] = ["source", obj_report_dir+"/src_compat_report.html"]
+    
+    compat[obj] = {}
+    for kind in reports:
+        ckind, path = reports[kind]
+        
+        title = obj+": "+ckind+" compatibility report"
+        
+        cnt = "<!-- kind:"+ckind+";verdict:compatible;affected:0;added:0;removed:0;tool_version:"+TOOL_VERSION+" -->\n"
+        cnt += compose_html_head(title, obj+", ABI, compatibility, report", title)
+        cnt += "<body>\n"
+        cnt += "<h1>"+title+"</h1>\n"
+        cnt += "<span class='result'>ABI dumps of old and new objects are identical, 0 problems found.</span>\n"
+        cnt += compose_footer()
+        cnt += "</body>\n</html>\n"
+        
+        write_file(path, cnt)
+        compat[obj][kind] = read_stat(path, report_dir)
+
+def get_removed_delta(removed_funcs, total_funcs):
+    return (1-(float(removed_funcs)/(total_funcs+removed_funcs)))
+
+def parse_thresholds(spec):
+    thresholds = {}
+    for e in spec.split(","):
+        m = re.match(r"\A\s*(BC|SC)\s*=\s*(\d+(\.\d+)?)\s*\Z", e, re.I)
+        if not m:
+            return None
+        thresholds[m.group(1).upper()] = float(m.group(2))
+    
+    return thresholds
+
+def gate_exit(passed, msg):
+    print "Gate "+("passed" if passed else "failed")+": "+msg
+    if passed:
+        s_exit("Ok")
+    s_exit("FailUnder")
+
+def check_gate(funcs, compat, pending, removed_funcs):
+    # range of the average rate that the pending comparisons can still reach
+    objs = [obj for obj in funcs if obj in compat or obj in pending]
+    total = sum([funcs[obj] for obj in objs])
+    left = sum([funcs[obj] for obj in pending])
+    
+    delta = 1
+    if removed_funcs:
+        delta = get_removed_delta(removed_funcs, total)
+    
+    settled = True
+    res = []
+    
+    thresholds = parse_thresholds(ARGS.fail_under)
+    for rate in sorted(thresholds.keys()):
+        kind = "bin"
+        if rate=="SC":
+            kind = "src"
+        
+        affected = sum([float(compat[obj][kind]["affected"])*funcs[obj] for obj in objs if obj in compat])
+        
+        best = 100
+        worst = 100
+        if total:
+            best -= affected/total
+            worst -= (affected+100*left)/total
+        
+        best *= delta
+        worst *= delta
+        
+        if best<thresholds[rate]:
+            gate_exit(False, rate+" is at most "+format_num(best)+"% (threshold: "+format_num(thresholds[rate])+"%)")
+        
+        if worst<thresholds[rate]:
+            settled = False
+        
+        res.append(rate+" >= "+format_num(worst)+"%")
+    
+    if settled:
+        gate_exit(True, ", ".join(res))
+
+def check_gate_removed(funcs, removed_funcs):
+    # the best rate left after removed objects, whatever the comparisons say
+    if not removed_funcs:
+        return
+    
+    delta = get_removed_delta(removed_funcs, sum(funcs.values()))
+    
+    thresholds = parse_thresholds(ARGS.fail_under)
+    for rate in sorted(thresholds.keys()):
+        if 100*delta<thresholds[rate]:
+            gate_exit(False, rate+" is at most "+format_num(100*delta)+"% due to "+str(removed_funcs)+" symbol(s) of removed objects (threshold: "+format_num(thresholds[rate])+"%)")
+
+def check_gate_soname(changed_soname):
+    if changed_soname:
+        obj = sorted(changed_soname.keys())[0]
+        gate_exit(False, "changed SONAME of "+obj+" to "+changed_soname[obj])
+
+def copy_results(same_as, compat, failed):
+    for obj in same_as:
+        if same_as[obj] in compat:
+            compat[obj] = compat[same_as[obj]]
+        elif same_as[obj] in failed:
+            failed[obj] = failed[same_as[obj]]
+
+def run_gate(cmp_jobs, compat, removed, changed_soname, abi_dump, report_dir, mem_budget, same_as):
+    check_gate_soname(changed_soname)
+    
+    # removed objects are known without comparing, so take them first
+    removed_funcs = 0
+    for obj in sorted(removed.keys()):
+        if obj in abi_dump["old"]:
+            removed_funcs += count_symbols(abi_dump["old"][obj], obj, "old")
+    
+    funcs = {}
+    for obj in compat:
+        funcs[obj] = count_symbols(abi_dump["old"][obj], obj, "old")
+    
+    for job in cmp_jobs:
+        funcs[job["object"]] = count_symbols(job["old_dump"], job["object"], "old")
+    
+    failed = {}
+    pending = {}
+    for job in cmp_jobs:
+        pending[job["object"]] = 1
+    
+    for obj in same_as:
+        funcs[obj] = count_symbols(abi_dump["old"][obj], obj, "old")
+        if same_as[obj] in pending:
+            pending[obj] = 1
+    
+    copy_results(same_as, compat, failed)
+    
+    check_gate_removed(funcs, removed_funcs)
+    check_gate(funcs, compat, pending, removed_funcs)
+    
+    # the largest objects move the average rate the most
+    cmp_jobs = sorted(cmp_jobs, key=lambda j: funcs[j["object"]], reverse=True)
+    while cmp_jobs:
+        batch = cmp_jobs[:ARGS.jobs]
+        cmp_jobs = cmp_jobs[ARGS.jobs:]
+        
+        run_jobs(batch, mem_budget)
+        
+        for job in batch:
+            read_cmp_job(job, report_dir, compat, failed)
+            del pending[job["object"]]
+        
+        copy_results(same_as, compat, failed)
+        for obj in same_as:
+            if obj in pending and same_as[obj] not in pending:
+                del pending[obj]
+        
+        report_killed_jobs(batch)
+        check_gate(funcs, compat, pending, removed_funcs)
+
+def get_dynsym(path):
+    symbols = {}
+    try:
+        r = subprocess.check_output(["readelf", "-W", "--dyn-syms", path])
+    except subprocess.CalledProcessError:
+        print "WARNING: can't read exported symbols of "+os.path.basename(path)
+        return symbols
+    
+    for line in r.split("\n"):
+        m = re.match(r"\s*\d+:\s+\S+\s+\S+\s+(\w+)\s+(\w+)\s+(\w+)\s+(\w+)\s+([^\s]+)", line)
+        if not m:
+            continue
+        
+        bind = m.group(2)
+        ndx = m.group(4)
+        sym = m.group(5)
+        
+        if bind not in ["GLOBAL", "WEAK", "GNU_UNIQUE"] or ndx=="UND":
+            continue
+        
+        ver = ""
+        m = re.match(r"(.+?)@@?(.+)\Z", sym)
+        if m:
+            sym = m.group(1)
+            ver = m.group(2)
+        elif ndx=="ABS":
+            # names of version definitions
+            continue
+        
+        if sym not in symbols:
+            symbols[sym] = {}
+        symbols[sym][ver] = 1
+    
+    return symbols
+
+def cmp_dynsym(old_syms, new_syms):
+    stat = {"added":0, "removed":0, "changed_version":0}
+    
+    for sym in old_syms:
+        if sym not in new_syms:
+            stat["removed"] += 1
+            continue
+        
+        # old binaries can't bind to the old version anymore
+        for ver in old_syms[sym]:
+            if ver not in new_syms[sym]:
+                stat["changed_version"] += 1
+                break
+    
+    for sym in new_syms:
+        if sym not in old_syms:
+            stat["added"] += 1
+    
+    stat["total"] = len(old_syms)
+    
+    return stat
+
+def quick_check():
+    print "Reading exported symbols ..."
+    
+    dynsym = {}
+    soname = {}
+    short_name = {}
+    shortest_name = {}
+    
+    for age in ["old", "new"]:
+        if "object" not in FILES[age]:
+            exit_status("NoABI", "shared objects are not found in "+age+" release package")
+        
+        dynsym[age] = {}
+        soname[age] = {}
+        short_name[age] = {}
+        shortest_name[age] = {}
+        
+        for oname in OBJECTS[age]:
+            short_name[age][oname] = get_short_name(oname)
+            shortest_name[age][oname] = get_shortest_name(oname)
+            
+            if oname in SAME_OBJECT[age]:
+                continue
+            
+            obj = OBJECTS[age][oname]
+            soname[age][oname] = get_soname(obj)
+            dynsym[age][oname] = get_object_dynsym(age, oname)
+        
+        for oname in SAME_OBJECT[age]:
+            soname[age][oname] = soname[age][SAME_OBJECT[age][oname]]
+            dynsym[age][oname] = get_object_dynsym(age, oname)
+    
+    old_objects = sorted(dynsym["old"].keys(), key=lambda x: x.lower())
+    new_objects = sorted(dynsym["new"].keys(), key=lambda x: x.lower())
+    
+    mapped, removed, added, renamed_object, match_reason = match_objects(old_objects, new_objects, soname, short_name, shortest_name)
+    changed_soname = get_changed_soname(mapped, soname)
+    
+    report_dir = init_report_dir("quick_report")
+    
+    stat = {}
+    for obj in mapped:
+        stat[obj] = cmp_dynsym(dynsym["old"][obj], dynsym["new"][mapped[obj]])
+    
+    added_t = sum([stat[obj]["added"] for obj in stat])
+    removed_t = sum([stat[obj]["removed"] for obj in stat])
+    changed_version_t = sum([stat[obj]["changed_version"] for obj in stat])
+    
+    meta = collections.OrderedDict()
+    meta["Added"] = added_t
+    meta["Removed"] = removed_t
+    meta["ChangedVersion"] = changed_version_t
+    meta["ObjectsAdded"] = len(added)
+    meta["ObjectsRemoved"] = len(removed)
+    meta["ChangedSoname"] = len(changed_soname)
+    
+    objects = collections.OrderedDict()
+    for obj in sorted(stat.keys(), key=lambda x: x.lower()):
+        res = collections.OrderedDict()
+        res["Added"] = stat[obj]["added"]
+        res["Removed"] = stat[obj]["removed"]
+        res["ChangedVersion"] = stat[obj]["changed_version"]
+        res["Total"] = stat[obj]["total"]
+        objects[obj] = res
+    
+    # report.json has its own list of objects
+    meta_objects = collections.OrderedDict(meta)
+    meta_objects["Objects"] = objects
+    write_meta(report_dir+"/meta.json", meta_objects)
+    
+    title, keywords, desc, info = compose_test_info("Exported symbols", "exported symbols")
+    
+    html = open(report_dir+"/index.html", "w")
+    html.write(compose_html_head(title, keywords, desc)+"<body>\n")
+    html.write(info)
+    
+    html.write("<h2>Shared Objects</h2>\n")
+    html.write("<table class='summary' id='objects'>\n")
+    html.write("<tr>\n")
+    html.write("<th data-key='name'>Object</th>\n")
+    html.write("<th data-key='added'>Added<br/>Symbols</th>\n")
+    html.write("<th data-key='removed'>Removed<br/>Symbols</th>\n")
+    html.write("<th data-key='changed_version'>Changed<br/>Version</th>\n")
+    html.write("<th data-key='symbols'>Total<br/>Symbols</th>\n")
+    html.write("</tr>\n")
+    
+    json_report = open_json_report(report_dir+"/report.json", meta)
+    
+    for obj in new_objects:
+        if obj in added:
+            html.write(compose_row_start(obj, {}))
+            html.write("<td class='object'>"+obj+"</td>\n")
+            html.write("<td colspan='4' class='added'>Added to package</td>\n")
+            html.write("</tr>\n")
+            
+            write_json_item(json_report, {"object":obj, "status":"added"})
+    
+    for obj in old_objects:
+        name = obj
+        
+        if obj in changed_soname:
+            name += "<br/>"
+            name += "<br/>"
+            name += "<span class='incompatible'>(changed SONAME from<br/>\""+soname["old"][obj]+"\"<br/>to<br/>\""+changed_soname[obj]+"\")</span>"
+        elif obj in renamed_object:
+            name += "<br/>"
+            name += "<br/>"
+            name += "<span class='incompatible'>(changed file name from<br/>\""+obj+"\"<br/>to<br/>\""+renamed_object[obj]+"\",<br/>matched by "+match_reason[obj]+")</span>"
+        
+        item = {"object":obj}
+        
+        if obj in mapped:
+            item["status"] = "compared"
+            item["new_object"] = mapped[obj]
+            item["old_soname"] = soname["old"][obj]
+            item["new_soname"] = soname["new"][mapped[obj]]
+            item["changed_soname"] = (obj in changed_soname)
+            item["renamed"] = (obj in renamed_object)
+            item["match"] = match_reason[obj]
+            item["added"] = stat[obj]["added"]
+            item["removed"] = stat[obj]["removed"]
+            item["changed_version"] = stat[obj]["changed_version"]
+            item["symbols"] = stat[obj]["total"]
+            
+            html.write(compose_row_start(obj, item))
+            html.write("<td class='object'>"+name+"</td>\n")
+            
+            if stat[obj]["added"]:
+                html.write("<td class='added'>"+str(stat[obj]["added"])+" new</td>\n")
+            else:
+                html.write("<td class='ok'>0</td>\n")
+            
+            if stat[obj]["removed"]:
+                html.write("<td class='removed'>"+str(stat[obj]["removed"])+" removed</td>\n")
+            else:
+                html.write("<td class='ok'>0</td>\n")
+            
+            if stat[obj]["changed_version"]:
+                html.write("<td class='incompatible'>"+str(stat[obj]["changed_version"])+" changed</td>\n")
+            else:
+                html.write("<td class='ok'>0</td>\n")
+            
+            html.write("<td>"+str(stat[obj]["total"])+"</td>\n")
+        else:
+            item["status"] = "removed"
+            
+            html.write(compose_row_start(obj, {}))
+            html.write("<td class='object'>"+name+"</td>\n")
+            html.write("<td colspan='4' class='removed'>Removed from package</td>\n")
+        
+        html.write("</tr>\n")
+        
+        write_json_item(json_report, item)
+    
+    close_json_report(json_report)
+    
+    html.write("</table>\n")
+    html.write(compose_table_script("objects"))
+    
+    html.write(compose_footer())
+    html.write("\n</body>\n</html>\n")
+    html.close()
+    
+    print "The report has been generated to: "+report_dir+"/index.html"
+    
+    update_reports_index(report_dir, "quick", meta)
+    
+    print "Added: "+str(added_t)+", Removed: "+str(removed_t)+", Changed version: "+str(changed_version_t)
+    
+    s_exit("Ok")
+
+def read_dump_index(path):
+    index = {}
+    index["empty"] = False
+    index["lang"] = None
+    index["names"] = []
+    index["symbols"] = None
+    
+    digest = hashlib.sha1()
+    volatile = re.compile(r"\A\s*'("+"|".join(DUMP_VOLATILE)+")' =>")
+    
+    in_symbols = False
+    f = open(path, 'r')
+    for line in f:
+        if not volatile.match(line):
+            digest.update(line)
+        
+        if in_symbols:
+            m = re.match(r"\A      '(.+)' => -?\d+", line)
+            if m:
+                index["names"].append(m.group(1))
+            elif line.startswith("  }"):
+                in_symbols = False
+        elif line.find("'Language' =>")!=-1:
+            m = re.search(r"'Language' => '(.+)'", line)
+            if m:
+                index["lang"] = m.group(1)
+        elif line.find("'SymbolInfo' =>")!=-1:
+            index["empty"] = (line.find("'SymbolInfo' => {}")!=-1)
+        elif line.startswith("  'Symbols' => {"):
+            in_symbols = True
+    
+    f.close()
+    
+    index["digest"] = digest.hexdigest()
+    return index
+
+def get_index_path(path):
+    return os.path.splitext(path)[0]+".index"
+
+def save_dump_index(path, index):
+    DUMP_INDEX[path] = index
+    
+    index_path = get_index_path(path)
+    tmp_path = index_path+"."+str(os.getpid())
+    write_file(tmp_path, json.dumps(index))
+    os.rename(tmp_path, index_path)
+
+def get_dump_index(path):
+    st = os.stat(path)
+    
+    if path in DUMP_INDEX:
+        index = DUMP_INDEX[path]
+    else:
+        index = None
+        index_path = get_index_path(path)
+        if os.path.exists(index_path):
+            try:
+                index = json.loads(read_file(index_path))
+            except ValueError:
+                pass
+    
+    # the dump has been replaced
+    if index and (index["size"]!=st.st_size or index["mtime"]!=st.st_mtime):
+        index = None
+    
+    if not index:
+        index = read_dump_index(path)
+        index["size"] = st.st_size
+        index["mtime"] = st.st_mtime
+        save_dump_index(path, index)
+    
+    DUMP_INDEX[path] = index
+    return index
+
+def remove_dump(path):
+    DUMP_INDEX.pop(path, None)
+    
+    for p in [path, get_index_path(path)]:
+        if os.path.exists(p):
+            os.remove(p)
+
+def get_dump_attr(path):
+    index = get_dump_index(path)
+    
+    attr = {}
+    attr["empty"] = index["empty"]
+    attr["lang"] = index["lang"]
+    return attr
+
+def count_symbols(path, obj, age):
+    global ABI_CC
+    
+    index = get_dump_index(path)
+    if index["symbols"] is None:
+        print "Counting symbols in the ABI dump for "+os.path.basename(obj)+" ("+age+")"
+        start = time.time()
+        count = subprocess.check_output([ABI_CC, "-count-symbols", path])
+        trace_span(os.path.basename(obj)+" ("+age+")", "count_symbols", start, "main", {"object":obj, "dump_size":os.path.getsize(path)})
+        index["symbols"] = int(count.rstrip())
+        save_dump_index(path, index)
+    
+    return index["symbols"]
+
+def read_bytes(path):
+    fp = open(path, 'rb')
+    buf = fp.read(4)
+    fp.close()
+    return binascii.b2a_hex(buf[0:4])
+
+def chmod_777(path):
+    subprocess.call(["chmod", "777", "-R", path])
+
+def chmod_dirs(path):
+    subprocess.call(["find", path, "-type", "d", "-exec", "chmod", "777", "{}", "+"])
+
+def parse_size(size):
+    m = re.match(r"\A(\d+(\.\d+)?)\s*([KMGT]?)B?\Z", size.strip().upper())
+    if not m:
+        return None
+    
+    mult = {"":1, "K":1024, "M":1024**2, "G":1024**3, "T":1024**4}
+    return int(float(m.group(1))*mult[m.group(3)])
+
+def format_size(size):
+    for unit in ["B", "K", "M", "G"]:
+        if size<1024:
+            return format_num(size)+unit
+        size = float(size)/1024
+    return format_num(size)+"T"
+
+def get_mem_available():
+    if not os.path.exists("/proc/meminfo"):
+        return None
+    
+    info = {}
+    for line in read_file("/proc/meminfo").split("\n"):
+        m = re.match(r"(\w+):\s+(\d+)\s+kB", line)
+        if m:
+            info[m.group(1)] = int(m.group(2))*1024
+    
+    # no MemAvailable before Linux 3.14
+    if "MemAvailable" in info:
+        return info["MemAvailable"]
+    
+    return info.get("MemTotal")
+
+def get_mem_budget():
+    if ARGS.mem_budget:
+        return parse_size(ARGS.mem_budget)
+    
+    mem = get_mem_available()
+    if mem is None and (ARGS.jobs>1 or ARGS.plan):
+        exit_status("Error", "can't read the amount of memory from /proc/meminfo, specify it with -mem-budget option")
+    
+    return mem
+
+def get_dumps_dir():
+    if ARGS.dumps_dir:
+        return ARGS.dumps_dir
+    
+    return "abi_dump"
+
+def load_json(path):
+    if os.path.exists(path):
+        try:
+            return json.loads(read_file(path))
+        except ValueError:
+            print "WARNING: ignoring broken "+path
+    
+    return {}
+
+def save_json(path, data):
+    hdir = os.path.dirname(path)
+    if hdir and not os.path.exists(hdir):
+        os.makedirs(hdir)
+    
+    tmp_path = path+"."+str(os.getpid())
+    write_file(tmp_path, json.dumps(data, indent=2, sort_keys=True))
+    os.rename(tmp_path, path)
+
+def check_dump_key(key):
+    parts = key.split("/")
+    if len(parts)!=3:
+        return False
+    
+    for p in parts:
+        if not p or p in [".", ".."]:
+            return False
+    
+    return True
+
+def export_dumps(key, path):
+    if not check_dump_key(key):
+        exit_status("Error", "invalid key \'"+key+"\', should be ARCH/NAME/VERSION")
+    
+    dump_dir = get_dumps_dir()+"/"+key
+    if not os.path.isdir(dump_dir):
+        exit_status("Error", "ABI dumps of "+key+" are not found in "+get_dumps_dir())
+    
+    files = {}
+    for root, dirs, fnames in os.walk(dump_dir):
+        if "ABI.dump" not in fnames:
+            continue
+        
+        dump_path = root+"/ABI.dump"
+        # bring the index up to date before packing
+        get_dump_index(dump_path)
+        
+        for p in [dump_path, get_index_path(dump_path)]:
+            rel = os.path.relpath(p, dump_dir)
+            files[rel] = {"sha1":get_file_digest(p), "size":os.path.getsize(p)}
+    
+    if not files:
+        exit_status("Error", "ABI dumps of "+key+" are not found in "+get_dumps_dir())
+    
+    manifest = {}
+    manifest["ToolVersion"] = TOOL_VERSION
+    manifest["Key"] = key
+    manifest["Created"] = int(time.time())
+    manifest["Files"] = files
+    
+    data = json.dumps(manifest, indent=2, sort_keys=True)
+    
+    tmp_path = path+"."+str(os.getpid())
+    tar = tarfile.open(tmp_path, "w:gz")
+    
+    info = tarfile.TarInfo(BUNDLE_MANIFEST)
+    info.size = len(data)
+    info.mtime = manifest["Created"]
+    tar.addfile(info, io.BytesIO(data))
+    
+    for rel in sorted(files):
+        tar.add(dump_dir+"/"+rel, arcname=key+"/"+rel)
+    
+    tar.close()
+    os.rename(tmp_path, path)
+    
+    print "Exported "+str(len(files)/2)+" ABI dump(s) of "+key+" to: "+path
+
+def read_bundle_manifest(tar):
+    try:
+        member = tar.getmember(BUNDLE_MANIFEST)
+        manifest = json.loads(tar.extractfile(member).read())
+    except (KeyError, ValueError):
+        return None
+    
+    if type(manifest) is not dict:
+        return None
+    
+    for attr in ["Key", "Files"]:
+        if attr not in manifest:
+            return None
+    
+    return manifest
+
+def import_dumps(path):
+    if not os.path.isfile(path):
+        exit_status("Error", "can't access \'"+path+"\'")
+    
+    try:
+        tar = tarfile.open(path, "r:gz")
+        members = tar.getmembers()
+    except (tarfile.TarError, IOError, EOFError, zlib.error):
+        exit_status("Error", "broken bundle \'"+path+"\'")
+    
+    manifest = read_bundle_manifest(tar)
+    if not manifest:
+        exit_status("Error", "no valid "+BUNDLE_MANIFEST+" in \'"+path+"\'")
+    
+    key = manifest["Key"]
+    files = manifest["Files"]
+    
+    if not check_dump_key(key):
+        exit_status("Error", "invalid key \'"+key+"\' in \'"+path+"\'")
+    
+    # only the listed regular files under the key are allowed
+    expected = {}
+    for rel in files:
+        norm = os.path.normpath(rel)
+        if norm!=rel or os.path.isabs(rel) or rel.split("/")[0]=="..":
+            exit_status("Error", "unsafe path \'"+rel+"\' in \'"+path+"\'")
+        
+        if os.path.basename(rel) not in ["ABI.dump", "ABI.index"]:
+            exit_status("Error", "unexpected file \'"+rel+"\' in \'"+path+"\'")
+        
+        expected[key+"/"+rel] = rel
+    
+    found = {}
+    for m in members:
+        if m.name==BUNDLE_MANIFEST:
+            continue
+        
+        if m.isdir():
+            # directories are created as needed
+            continue
+        
+        if m.name not in expected or not m.isfile():
+            exit_status("Error", "unexpected member \'"+m.name+"\' in \'"+path+"\'")
+        
+        found[m.name] = m
+    
+    for name in expected:
+        if name not in found:
+            exit_status("Error", "missing member \'"+name+"\' in \'"+path+"\'")
+    
+    dumps_dir = get_dumps_dir()
+    if not os.path.exists(dumps_dir):
+        os.makedirs(dumps_dir)
+    
+    # same file system as the destination, to move files atomically
+    stage = tempfile.mkdtemp(prefix=".import-", dir=dumps_dir)
+    
+    try:
+        tar.extractall(stage, members=found.values())
+    except (tarfile.TarError, IOError, EOFError, zlib.error):
+        shutil.rmtree(stage)
+        exit_status("Error", "broken bundle \'"+path+"\'")
+    
+    tar.close()
+    
+    for rel in files:
+        p = stage+"/"+key+"/"+rel
+        if os.path.getsize(p)!=files[rel]["size"] or get_file_digest(p)!=files[rel]["sha1"]:
+            shutil.rmtree(stage)
+            exit_status("Error", "checksum mismatch of \'"+rel+"\' in \'"+path+"\'")
+    
+    dump_dir = dumps_dir+"/"+key
+    print "Using dumps directory: "+dump_dir
+    
+    imported = 0
+    for rel in sorted(files):
+        if os.path.basename(rel)!="ABI.dump":
+            continue
+        
+        oname = os.path.dirname(rel)
+        src = stage+"/"+key+"/"+rel
+        dest = dump_dir+"/"+rel
+        
+        if os.path.exists(dest):
+            if ARGS.rebuild_dumps:
+                remove_dump(dest)
+            else:
+                print "Keeping existing ABI dump for "+oname
+                continue
+        
+        # the index is valid for the dump with its new mtime
+        src_index = get_index_path(src)
+        if os.path.exists(src_index):
+            try:
+                index = json.loads(read_file(src_index))
+                index["mtime"] = os.stat(src).st_mtime
+                write_file(src_index, json.dumps(index))
+            except ValueError:
+                os.remove(src_index)
+        
+        dest_dir = os.path.dirname(dest)
+        if not os.path.exists(dest_dir):
+            os.makedirs(dest_dir)
+        
+        # the index goes last, a dump without it is simply reindexed
+        os.rename(src, dest)
+        if os.path.exists(src_index):
+            os.rename(src_index, get_index_path(dest))
+        
+        print "Imported ABI dump for "+oname
+        imported += 1
+    
+    shutil.rmtree(stage)
+    
+    print "Imported "+str(imported)+" ABI dump(s) of "+key+" from: "+path
+
+def get_history_ratio(history, attr, base, default):
+    # fixed overhead of small objects says little about the others
+    ratios = []
+    for k in history:
+        h = history[k]
+        if h.get(attr) is not None and h["size"]>=HISTORY_MIN_SIZE:
+            ratios.append(max(0.0, float(h[attr]-base)/h["size"]))
+    
+    if not ratios:
+        return default
+    
+    ratios.sort()
+    return ratios[(len(ratios)*HISTORY_PERCENTILE+99)/100-1]
+
+def estimate_dump_mem(history, key, size, budget):
+    ratio = get_history_ratio(history, "peak", DUMP_MEM_BASE, DUMP_MEM_RATIO)
+    
+    est = int(DUMP_MEM_BASE+ratio*size)
+    if budget:
+        est = min(est, budget)
+    
+    if key in history:
+        h = history[key]
+        if h["size"]:
+            est = int(h["peak"]*max(1.0, float(size)/h["size"]))
+        else:
+            est = h["peak"]
+    
+    return est
+
+def estimate_dump_cpu(history, key, size):
+    ratio = get_history_ratio(history, "cpu", 0, DUMP_CPU_RATIO)
+    
+    est = ratio*size
+    
+    if key in history and "cpu" in history[key]:
+        h = history[key]
+        if h["size"]:
+            est = h["cpu"]*max(1.0, float(size)/h["size"])
+        else:
+            est = h["cpu"]
+    
+    return round(est, 1)
+
+def plan_run():
+    global ABI_CC_CUR_VER
+    if check_cmd(ABI_CC):
+        # part of the report up-to-date check
+        ABI_CC_CUR_VER = get_dumpversion(ABI_CC)
+    
+    dumps_dir = get_dumps_dir()
+    mem_history = load_json(dumps_dir+"/"+DUMP_MEM_HISTORY)
+    
+    mem_budget = get_mem_budget()
+    
+    jobs = []
+    
+    extract_ids = {}
+    for item in PLAN_PKGS:
+        job = {}
+        job["id"] = "extract:"+item["age"]+":"+os.path.basename(item["package"])
+        job["type"] = "extract"
+        job["deps"] = []
+        job["package"] = item["package"]
+        job["kind"] = item["kind"]
+        job["size"] = item["size"]
+        job["cached"] = item["cached"]
+        jobs.append(job)
+        
+        if item["age"] not in extract_ids:
+            extract_ids[item["age"]] = []
+        extract_ids[item["age"]].append(job["id"])
+    
+    abi_dump = {}
+    dump_size = {}
+    dump_ids = {}
+    soname = {}
+    short_name = {}
+    shortest_name = {}
+    
+    for age in AGES:
+        if "debuginfo" not in FILES[age]:
+            exit_status("NoDebug", "debuginfo files are not found in "+age+" debuginfo package")
+        
+        if "object" not in FILES[age]:
+            exit_status("NoABI", "shared objects are not found in "+age+" release package")
+        
+        abi_dump[age] = {}
+        dump_size[age] = {}
+        dump_ids[age] = {}
+        soname[age] = {}
+        short_name[age] = {}
+        shortest_name[age] = {}
+        
+        pname = PKGS_ATTR[age]["name"]
+        dump_dir = dumps_dir+"/"+PKGS_ATTR[age]["arch"]+"/"+pname+"/"+PKGS_ATTR[age]["ver"]
+        
+        for oname in sorted(OBJECTS[age].keys(), key=lambda x: x.lower()):
+            short_name[age][oname] = get_short_name(oname)
+            shortest_name[age][oname] = get_shortest_name(oname)
+            
+            if oname in SAME_OBJECT[age]:
+                continue
+            
+            soname[age][oname] = get_soname(OBJECTS[age][oname])
+            
+            obj_dump_path = dump_dir+"/"+oname+"/ABI.dump"
+            debuginfo_size = get_debuginfo_size(age, oname)
+            mem_key = pname+"/"+oname
+            
+            job = {}
+            job["id"] = "dump:"+age+":"+oname
+            job["type"] = "dump"
+            job["deps"] = extract_ids.get(age, [])
+            job["object"] = oname
+            job["dump"] = obj_dump_path
+            job["debuginfo_size"] = debuginfo_size
+            job["cached"] = os.path.exists(obj_dump_path) and not ARGS.rebuild_dumps
+            
+            if job["cached"]:
+                abi_dump[age][oname] = obj_dump_path
+                dump_size[age][oname] = os.path.getsize(obj_dump_path)
+            else:
+                job["mem"] = estimate_dump_mem(mem_history, mem_key, debuginfo_size, mem_budget)
+                job["cpu"] = estimate_dump_cpu(mem_history, mem_key, debuginfo_size)
+                # no ABI dump yet, the debuginfo is the upper bound
+                dump_size[age][oname] = debuginfo_size
+            
+            jobs.append(job)
+            dump_ids[age][oname] = job["id"]
+        
+        for oname in SAME_OBJECT[age]:
+            obj = SAME_OBJECT[age][oname]
+            soname[age][oname] = soname[age][obj]
+            dump_size[age][oname] = dump_size[age][obj]
+            dump_ids[age][oname] = dump_ids[age][obj]
+            if obj in abi_dump[age]:
+                abi_dump[age][oname] = abi_dump[age][obj]
+    
+    pairs = []
+    if not ARGS.dump:
+        old_objects = sorted(OBJECTS["old"].keys(), key=lambda x: x.lower())
+        new_objects = sorted(OBJECTS["new"].keys(), key=lambda x: x.lower())
+        mapped, removed, added, renamed_object, match_reason = match_objects(old_objects, new_objects, soname, short_name, shortest_name)
+        
+        report_dir = get_report_dir("compat_report")
+        
+        compared = {}
+        cmp_ids = []
+        for obj in sorted(mapped.keys(), key=lambda x: x.lower()):
+            new_obj = mapped[obj]
+            
+            pair = {"old":obj, "new":new_obj, "match":match_reason.get(obj, "name")}
+            pairs.append(pair)
+            
+            deps = (dump_ids["old"][obj], dump_ids["new"][new_obj])
+            if deps in compared:
+                pair["same_as"] = compared[deps]
+                continue
+            compared[deps] = obj
+            
+            job = {}
+            job["id"] = "compare:"+obj
+            job["type"] = "compare"
+            job["deps"] = list(deps)
+            job["object"] = obj
+            job["new_object"] = new_obj
+            job["cached"] = False
+            
+            if obj in abi_dump["old"] and new_obj in abi_dump["new"]:
+                old_dump = abi_dump["old"][obj]
+                new_dump = abi_dump["new"][new_obj]
+                if get_dump_digest(old_dump)==get_dump_digest(new_dump):
+                    job["cached"] = True
+                    job["identical"] = True
+                elif read_cmp_key(report_dir+"/"+obj)==get_cmp_key(new_obj, old_dump, new_dump):
+                    job["cached"] = True
+            
+            if not job["cached"]:
+                size = dump_size["old"][obj]+dump_size["new"][new_obj]
+                job["mem"] = DUMP_MEM_BASE+CMP_MEM_RATIO*size
+                job["cpu"] = round(CMP_CPU_RATIO*size, 1)
+            
+            jobs.append(job)
+            cmp_ids.append(job["id"])
+        
+        job = {}
+        job["id"] = "report"
+        job["type"] = "report"
+        job["deps"] = cmp_ids
+        job["report_dir"] = report_dir
+        # an existing report stops the run early
+        job["cached"] = os.path.exists(report_dir) and not ARGS.rebuild_report
+        jobs.append(job)
+    
+    # the largest jobs running together
+    mems = sorted([j["mem"] for j in jobs if "mem" in j], reverse=True)
+    
+    summary = {}
+    for t in ["extract", "dump", "compare"]:
+        summary[t] = {"hit":0, "miss":0}
+        for job in jobs:
+            if job["type"]==t:
+                if job["cached"]:
+                    summary[t]["hit"] += 1
+                else:
+                    summary[t]["miss"] += 1
+    
+    summary["cpu"] = round(sum([job.get("cpu", 0) for job in jobs]), 1)
+    summary["mem_job"] = max(mems+[0])
+    summary["mem"] = min(mem_budget, sum(mems[:ARGS.jobs]))
+    summary["disk"] = sum([job["size"] for job in jobs if job["type"]=="extract" and not job["cached"]])
+    
+    plan = {}
+    plan["ToolVersion"] = TOOL_VERSION
+    for age in AGES:
+        plan[age.capitalize()] = PKGS_ATTR[age]
+    plan["Jobs"] = jobs
+    plan["Pairs"] = pairs
+    plan["Summary"] = summary
+    
+    save_json(ARGS.plan, plan)
+    
+    print "ABI dumps: "+str(summary["dump"]["hit"])+" cached, "+str(summary["dump"]["miss"])+" to create"
+    if not ARGS.dump:
+        print "Comparisons: "+str(summary["compare"]["hit"])+" up to date, "+str(summary["compare"]["miss"])+" to run"
+    print "Estimated CPU time: "+str(summary["cpu"])+"s"
+    print "Estimated memory: "+format_size(summary["mem"])+" ("+format_size(summary["mem_job"])+" per job at most)"
+    print "Estimated disk space for extracted packages: "+format_size(summary["disk"])
+    print "The plan has been saved to: "+ARGS.plan
+
+def get_trace_lane(name):
+    # lanes are listed in order of appearance
+    with TRACE_LOCK:
+        if name not in TRACE_LANES:
+            tid = len(TRACE_LANES)
+            TRACE_LANES[name] = tid
+            TRACE.append({"name":"thread_name", "ph":"M", "pid":os.getpid(), "tid":tid, "args":{"name":name}})
+            TRACE.append({"name":"thread_sort_index", "ph":"M", "pid":os.getpid(), "tid":tid, "args":{"sort_index":tid}})
+        
+        return TRACE_LANES[name]
+
+def trace_span(name, cat, start, lane, args):
+    if TRACE is None:
+        return
+    
+    end = time.time()
+    
+    event = {}
+    event["name"] = name
+    event["cat"] = cat
+    event["ph"] = "X"
+    event["ts"] = int((start-TRACE_START)*1000000)
+    event["dur"] = int((end-start)*1000000)
+    event["pid"] = os.getpid()
+    event["args"] = args
+    
+    # discovery threads add spans too
+    with TRACE_LOCK:
+        event["tid"] = get_trace_lane(lane)
+        TRACE.append(event)
+
+def trace_job(job, lane):
+    args = dict(job.get("args", {}))
+    args["mem_estimate"] = job["mem"]
+    args["peak"] = job["peak"]
+    args["cpu"] = job.get("cpu")
+    args["ecode"] = job.get("ecode")
+    if job["killed"]:
+        args["killed"] = job["killed"]
+    
+    trace_span(job["name"], os.path.basename(job["cmd"][0]), job.get("start", time.time()), lane, args)
+
+def save_trace():
+    with TRACE_LOCK:
+        TRACE.append({"name":"process_name", "ph":"M", "pid":os.getpid(), "tid":0, "args":{"name":CMD_NAME}})
+        trace = {"traceEvents":TRACE, "displayTimeUnit":"ms"}
+        save_json(ARGS.trace, trace)
+    
+    print "The trace has been saved to: "+ARGS.trace
+
+def get_job_limits(mem_limit):
+    def set_limits():
+        # own process group to kill the job along with its children
+        os.setsid()
+        
+        if mem_limit:
+            resource.setrlimit(resource.RLIMIT_AS, (mem_limit, mem_limit))
+        
+        if ARGS.job_cpu_limit:
+            resource.setrlimit(resource.RLIMIT_CPU, (ARGS.job_cpu_limit, ARGS.job_cpu_limit+5))
+    
+    return set_limits
+
+def start_job(job):
+    global RUNNING_JOBS
+    
+    if ARGS.debug:
+        print "Executing "+" ".join(job["cmd"])
+    
+    log = open(job["log"], "a")
+    err = open(job["log"]+".err", "w")
+    
+    proc = subprocess.Popen(job["cmd"], stdout=log, stderr=err, preexec_fn=get_job_limits(job["mem_limit"]))
+    
+    log.close()
+    err.close()
+    
+    # the lowest lane not taken by a running job
+    lanes = [j["lane"] for j in RUNNING_JOBS.values()]
+    lane = 1
+    while lane in lanes:
+        lane += 1
+    
+    job["proc"] = proc
+    job["start"] = time.time()
+    job["killed"] = None
+    job["lane"] = lane
+    
+    if TRACE is not None:
+        get_trace_lane("worker "+str(lane))
+    
+    RUNNING_JOBS[proc.pid] = job
+
+def finish_job(job, status, rusage):
+    global RUNNING_JOBS
+    
+    proc = job["proc"]
+    del RUNNING_JOBS[proc.pid]
+    
+    if os.WIFSIGNALED(status):
+        proc.returncode = -os.WTERMSIG(status)
+    else:
+        proc.returncode = os.WEXITSTATUS(status)
+    
+    job["ecode"] = proc.returncode
+    job["peak"] = rusage.ru_maxrss*1024
+    job["cpu"] = rusage.ru_utime+rusage.ru_stime
+    
+    errors = read_file(job["log"]+".err")
+    if errors:
+        sys.stderr.write(errors)
+    
+    if not job["killed"]:
+        if re.search(r"Out of memory|Cannot allocate memory|MemoryError", errors):
+            job["killed"] = "memory limit of "+format_size(job["mem_limit"])+" exceeded"
+        elif proc.returncode==-signal.SIGXCPU:
+            job["killed"] = "CPU time limit of "+str(ARGS.job_cpu_limit)+"s exceeded"
+        elif proc.returncode==-signal.SIGKILL and ARGS.job_cpu_limit and job["cpu"]>=ARGS.job_cpu_limit:
+            # SIGXCPU was ignored, the hard limit is reached
+            job["killed"] = "CPU time limit of "+str(ARGS.job_cpu_limit)+"s exceeded"
+        elif proc.returncode==-signal.SIGKILL:
+            job["killed"] = "killed by SIGKILL (out of memory?)"
+    
+    trace_job(job, "worker "+str(job["lane"]))
+
+def kill_jobs():
+    for pid in RUNNING_JOBS.keys():
+        try:
+            os.killpg(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+        except OSError:
+            pass
+    
+    RUNNING_JOBS.clear()
+
+def run_jobs(jobs, budget):
+    if ARGS.queue:
+        run_queued_jobs(jobs)
+        return
+    
+    pending = sorted(jobs, key=lambda j: j["mem"], reverse=True)
+    used = 0
+    
+    while pending or RUNNING_JOBS:
+        # admit the largest jobs that fit into the budget
+        for job in list(pending):
+            if len(RUNNING_JOBS)>=ARGS.jobs:
+                break
+            
+            if budget and job["mem"]>budget-used:
+                if RUNNING_JOBS:
+                    continue
+                print "WARNING: estimated memory usage of "+job["name"]+" ("+format_size(job["mem"])+") exceeds the budget"
+            
+            print job["msg"]
+            start_job(job)
+            used += job["mem"]
+            pending.remove(job)
+        
+        reaped = False
+        for pid in RUNNING_JOBS.keys():
+            job = RUNNING_JOBS[pid]
+            
+            r_pid, status, rusage = os.wait4(pid, os.WNOHANG)
+            if r_pid:
+                finish_job(job, status, rusage)
+                used -= job["mem"]
+                reaped = True
+                continue
+            
+            if ARGS.job_timeout and time.time()-job["start"]>ARGS.job_timeout:
+                job["killed"] = "timeout of "+str(ARGS.job_timeout)+"s exceeded"
+                os.killpg(pid, signal.SIGKILL)
+        
+        if not reaped:
+            time.sleep(0.05)
+
+def open_queue(qdir):
+    conn = sqlite3.connect(qdir+"/"+QUEUE_DB, timeout=600)
+    conn.execute("CREATE TABLE IF NOT EXISTS jobs (id INTEGER PRIMARY KEY AUTOINCREMENT, batch TEXT, name TEXT, msg TEXT, cmd TEXT, log TEXT, cwd TEXT, mem INTEGER, mem_limit INTEGER, timeout INTEGER, cpu_limit INTEGER, lease_time INTEGER, status TEXT, worker TEXT, lease REAL, attempts INTEGER, ecode INTEGER, killed TEXT, peak INTEGER, outputs TEXT)")
+    conn.execute("CREATE TABLE IF NOT EXISTS workers (name TEXT PRIMARY KEY, seen REAL)")
+    
+    # queues created by older versions
+    try:
+        conn.execute("ALTER TABLE jobs ADD COLUMN outputs TEXT")
+    except sqlite3.OperationalError:
+        pass
+    
+    conn.commit()
+    return conn
+
+def get_worker_name():
+    return socket.gethostname()+":"+str(os.getpid())
+
+def run_queued_jobs(jobs):
+    global QUEUE_BATCH
+    if not QUEUE_BATCH:
+        QUEUE_BATCH = get_worker_name()
+    
+    conn = open_queue(ARGS.queue)
+    
+    pending = {}
+    with conn:
+        for job in jobs:
+            cur = conn.execute("INSERT INTO jobs (batch, name, msg, cmd, log, cwd, mem, mem_limit, timeout, cpu_limit, lease_time, status, attempts, outputs) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 'queued', 0, ?)",
+                [QUEUE_BATCH, job["name"], job["msg"], json.dumps(job["cmd"]), os.path.abspath(job["log"]), os.getcwd(), job["mem"], job["mem_limit"], ARGS.job_timeout, ARGS.job_cpu_limit, ARGS.queue_lease, json.dumps(job.get("outputs", []))])
+            job["killed"] = None
+            job["peak"] = None
+            job["cpu"] = None
+            pending[cur.lastrowid] = job
+    
+    print "Queued "+str(len(jobs))+" job(s) to "+ARGS.queue
+    
+    # workers may be started after the jobs are queued
+    alive = time.time()
+    
+    while pending:
+        time.sleep(QUEUE_POLL)
+        
+        seen = conn.execute("SELECT MAX(seen) FROM workers").fetchone()[0]
+        if seen:
+            alive = max(alive, seen)
+        
+        if time.time()-alive>ARGS.queue_lease:
+            exit_status("Error", "no live workers in "+ARGS.queue+" for "+str(ARGS.queue_lease)+" seconds")
+        
+        for job_id, status, worker, ecode, killed, peak in conn.execute("SELECT id, status, worker, ecode, killed, peak FROM jobs WHERE batch=? AND status!='queued'", [QUEUE_BATCH]):
+            if job_id not in pending:
+                continue
+            
+            job = pending[job_id]
+            if job.get("worker")!=worker:
+                print job["msg"]+" on "+worker
+                job["worker"] = worker
+                job["start"] = time.time()
+            
+            if status=="done":
+                job["ecode"] = ecode
+                job["killed"] = killed
+                job["peak"] = peak
+                del pending[job_id]
+                trace_job(job, worker)
+    
+    with conn:
+        conn.execute("DELETE FROM jobs WHERE batch=? AND status='done'", [QUEUE_BATCH])
+    
+    conn.close()
+
+def cancel_queued_jobs():
+    conn = open_queue(ARGS.queue)
+    with conn:
+        conn.execute("DELETE FROM jobs WHERE batch=? AND status!='running'", [QUEUE_BATCH])
+        # removed by their workers, the results are dropped
+        conn.execute("UPDATE jobs SET status='cancelled' WHERE batch=? AND status='running'", [QUEUE_BATCH])
+    conn.close()
+
+def claim_job(conn, worker):
+    now = time.time()
+    
+    with conn:
+        # jobs of lost workers are given up after several attempts
+        conn.execute("UPDATE jobs SET status='done', killed='worker '||worker||' was lost' WHERE status='running' AND lease<? AND attempts>=?", [now, QUEUE_ATTEMPTS])
+        
+        # left by lost coordinators and workers
+        conn.execute("DELETE FROM jobs WHERE status IN ('done', 'cancelled') AND lease<?", [now-QUEUE_KEEP])
+        conn.execute("DELETE FROM workers WHERE seen<?", [now-QUEUE_KEEP])
+    
+    rows = conn.execute("SELECT id, name, msg, cmd, log, cwd, mem, mem_limit, timeout, cpu_limit, lease_time, outputs FROM jobs WHERE status='queued' OR (status='running' AND lease<?) ORDER BY mem DESC, id LIMIT 10", [now]).fetchall()
+    for row in rows:
+        # other workers may claim it at the same time
+        with conn:
+            cur = conn.execute("UPDATE jobs SET status='running', worker=?, lease=?, attempts=attempts+1 WHERE id=? AND (status='queued' OR (status='running' AND lease<?))", [worker, now+row[10], row[0], now])
+        
+        if cur.rowcount==1:
+            return row
+    
+    return None
+
+def renew_lease(job_id, worker, lease_time):
+    stop = threading.Event()
+    
+    def renew():
+        conn = open_queue(ARGS.worker)
+        while not stop.wait(min(lease_time/3.0, QUEUE_BEAT)):
+            with conn:
+                conn.execute("UPDATE jobs SET lease=? WHERE id=? AND worker=?", [time.time()+lease_time, job_id, worker])
+                beat_worker(conn, worker)
+        conn.close()
+    
+    thread = threading.Thread(target=renew)
+    thread.daemon = True
+    thread.start()
+    
+    return stop
 
-def get_version(prog):
-    ver = subprocess.check_output([prog, "--version"])
-    return ver.rstrip()
+def beat_worker(conn, worker):
+    conn.execute("INSERT OR REPLACE INTO workers (name, seen) VALUES (?, ?)", [worker, time.time()])
 
-def cmp_vers(x, y):
-    xp = x.split(".")
-    yp = y.split(".")
+def finish_claimed_job(conn, job, job_id, worker, tmp):
+    # results are published only by the worker still holding the claim,
+    # within the transaction that marks the job as done
+    with conn:
+        cur = conn.execute("UPDATE jobs SET status='done', ecode=?, killed=?, peak=? WHERE id=? AND worker=? AND status='running'", [job["ecode"], job["killed"], job["peak"], job_id, worker])
+        owned = (cur.rowcount==1)
+        
+        for path in tmp:
+            if not os.path.exists(tmp[path]):
+                continue
+            
+            if owned:
+                os.rename(tmp[path], path)
+            else:
+                os.remove(tmp[path])
+        
+        if not owned:
+            # the coordinator is gone
+            conn.execute("DELETE FROM jobs WHERE id=? AND worker=? AND status='cancelled'", [job_id, worker])
     
-    for k in range(len(xp), max(len(xp), len(yp))):
-        xp.append("0")
+    return owned
+
+def run_worker():
+    worker = get_worker_name()
+    conn = open_queue(ARGS.worker)
     
-    for k in range(len(yp), max(len(xp), len(yp))):
-        yp.append("0")
+    print "Worker "+worker+" is waiting for jobs in "+ARGS.worker
     
-    for k in range(0, len(xp)):
-        a = xp[k]
-        b = yp[k]
+    beat = 0
+    idle = time.time()
+    while True:
+        if time.time()-beat>QUEUE_BEAT:
+            with conn:
+                beat_worker(conn, worker)
+            beat = time.time()
         
-        if a==b:
+        row = claim_job(conn, worker)
+        if row is None:
+            if ARGS.worker_idle and time.time()-idle>ARGS.worker_idle:
+                break
+            time.sleep(QUEUE_POLL)
             continue
         
-        if(int(a) > int(b)):
-            return 1
+        job_id, name, msg, cmd, log, cwd, mem, mem_limit, timeout, cpu_limit, lease_time, outputs = row
+        
+        # a lost worker may still be running the same job
+        suffix = "."+worker.replace(":", "_")+".tmp"
+        tmp = {}
+        for path in [log]+json.loads(outputs or "[]"):
+            tmp[path] = path+suffix
+        tmp[log+".err"] = tmp[log]+".err"
+        
+        job = {}
+        job["name"] = name
+        job["msg"] = msg
+        job["cmd"] = [tmp.get(arg, arg) for arg in json.loads(cmd)]
+        job["log"] = tmp[log]
+        job["mem"] = mem
+        job["mem_limit"] = mem_limit
+        
+        # limits of the coordinator
+        ARGS.job_timeout = timeout
+        ARGS.job_cpu_limit = cpu_limit
+        
+        stop = renew_lease(job_id, worker, lease_time)
+        os.chdir(cwd)
+        run_jobs([job], None)
+        stop.set()
+        
+        if not finish_claimed_job(conn, job, job_id, worker, tmp):
+            print "Dropped results of "+name+", the job was taken over or cancelled"
+        os.chdir(ORIG_DIR)
+        
+        idle = time.time()
+    
+    with conn:
+        conn.execute("DELETE FROM workers WHERE name=?", [worker])
+    conn.close()
+
+def get_pkg_kind(fname):
+    if re.match(r".*-(headers-|devel-|dev-|dev_).*", fname):
+        return "devel"
+    elif re.match(r".*-(debuginfo-|dbg[_\-]).*", fname):
+        return "debug"
+    
+    return "rel"
+
+def get_base_name(name):
+    return re.sub(r"-(debuginfo|dbg|devel|dev|headers)\Z", "", name)
+
+def get_ver_key(ver):
+    # epoch first, numeric segments are newer than alphabetic ones as in rpmvercmp
+    epoch = 0
+    m = re.match(r"(\d+):(.*)\Z", ver)
+    if m:
+        epoch = int(m.group(1))
+        ver = m.group(2)
+    
+    key = [(1, epoch)]
+    for p in re.findall(r"\d+|[a-zA-Z]+", ver):
+        if p.isdigit():
+            key.append((1, int(p)))
         else:
-            return -1
+            key.append((0, p))
     
-    return 0
+    return key
 
-def get_dump_attr(path):
-    attr = {}
-    attr["empty"] = False
-    attr["lang"] = None
-    f = open(path, 'r')
-    for line in f:
-        if line.find("'Language' =>")!=-1:
-            m = re.search(r"'Language' => '(.+)'", line)
-            if m:
-                attr["lang"] = m.group(1)
-        elif line.find("'SymbolInfo' =>")!=-1:
-            attr["empty"] = (line.find("'SymbolInfo' => {}")!=-1)
-            break
+def open_inotify():
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        fd = libc.inotify_init1(IN_NONBLOCK|IN_CLOEXEC)
+    except (OSError, AttributeError):
+        return None
     
-    f.close()
-    return attr
+    if fd<0:
+        return None
+    
+    return {"libc":libc, "fd":fd}
 
-def count_symbols(path, obj, age):
-    global ABI_CC
-    print "Counting symbols in the ABI dump for "+os.path.basename(obj)+" ("+age+")"
-    count = subprocess.check_output([ABI_CC, "-count-symbols", path])
-    return int(count.rstrip())
+def close_inotify(watcher):
+    os.close(watcher["fd"])
 
-def read_bytes(path):
-    fp = open(path, 'rb')
-    buf = fp.read()
-    fp.close()
-    return binascii.b2a_hex(buf[0:4])
+def wait_repo(watcher, timeout):
+    if not watcher:
+        time.sleep(timeout)
+        return
+    
+    r, w, x = select.select([watcher["fd"]], [], [], timeout)
+    if not r:
+        return
+    
+    # events only wake up the next scan
+    while True:
+        try:
+            if not os.read(watcher["fd"], 65536):
+                break
+        except OSError as e:
+            if e.errno==errno.EAGAIN:
+                break
+            raise
 
-def chmod_777(path):
-    subprocess.call(["chmod", "777", "-R", path])
+def scan_repo(top, watcher):
+    found = {}
+    for root, dirs, files in os.walk(top):
+        dirs[:] = [d for d in dirs if not d.startswith(".")]
+        
+        if watcher and watcher["libc"].inotify_add_watch(watcher["fd"], root, IN_CLOSE_WRITE|IN_MOVED_TO|IN_CREATE)<0:
+            print "WARNING: can't watch "+root+", polling every "+str(ARGS.watch_interval)+" seconds"
+            close_inotify(watcher)
+            watcher = None
+        
+        for f in files:
+            path = os.path.join(root, f)
+            if get_fmt(path) not in PKG_FORMATS:
+                continue
+            
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            
+            found[path] = [st.st_size, st.st_mtime]
+    
+    return found, watcher
+
+def get_watch_groups(pkgs):
+    by_ver = {}
+    for path in sorted(pkgs):
+        name, ver, arch = pkgs[path]
+        key = (get_base_name(name), ver)
+        if key not in by_ver:
+            by_ver[key] = {}
+        
+        if arch not in by_ver[key]:
+            by_ver[key][arch] = {}
+        
+        kind = get_pkg_kind(os.path.basename(path))
+        if kind not in by_ver[key][arch]:
+            by_ver[key][arch][kind] = []
+        by_ver[key][arch][kind].append(path)
+    
+    groups = {}
+    for (name, ver), archs in by_ver.items():
+        for arch in archs:
+            if "rel" not in archs[arch]:
+                continue
+            
+            group = {"name":name, "ver":ver, "arch":arch}
+            group.update(archs[arch])
+            
+            # debuginfo and headers may be arch-independent
+            for noarch in NOARCH:
+                if noarch!=arch and noarch in archs:
+                    for kind in ["debug", "devel"]:
+                        if kind not in group and kind in archs[noarch]:
+                            group[kind] = archs[noarch][kind]
+            
+            groups[arch+"/"+name+"/"+ver] = group
+    
+    return groups
+
+def get_group_pkgs(group):
+    pkgs = []
+    for kind in ["rel", "debug", "devel"]:
+        if kind in group:
+            pkgs.extend(group[kind])
+    
+    return pkgs
+
+def get_child_args(skip):
+    # options of this run without the given ones and their values
+    args = []
+    argv = sys.argv[1:]
+    k = 0
+    while k<len(argv):
+        opt = argv[k].split("=", 1)[0]
+        if opt in skip:
+            if "=" not in argv[k]:
+                k += skip[opt]
+        else:
+            args.append(argv[k])
+        k += 1
+    
+    return [sys.executable, os.path.realpath(__file__)]+args
+
+def watch_repo(top):
+    top = os.path.abspath(top)
+    
+    state_path = get_dumps_dir()+"/"+WATCH_STATE
+    state = load_json(state_path)
+    
+    first_run = top not in state
+    if first_run:
+        state[top] = {}
+    done = state[top]
+    
+    watcher = open_inotify()
+    if watcher:
+        print "Watching "+top
+    else:
+        print "Watching "+top+", polling every "+str(ARGS.watch_interval)+" seconds"
+    
+    child_args = get_child_args({"-watch":1, "-watch-interval":1, "-watch-settle":1, "-trace":1})
+    
+    # there is nothing to gate without a comparison
+    dump_args = get_child_args({"-watch":1, "-watch-interval":1, "-watch-settle":1, "-trace":1, "-fail-under":1})
+    
+    attrs_cache = get_dumps_dir()+"/"+PKG_ATTRS_CACHE
+    PKG_ATTRS.update(load_json(attrs_cache))
+    cached = len(PKG_ATTRS)
+    
+    files = {}
+    attrs = {}
+    while True:
+        found, watcher = scan_repo(top, watcher)
+        now = time.time()
+        
+        busy = {}
+        for path in found:
+            if files.get(path)==found[path]:
+                continue
+            
+            # the file is still being written
+            if not first_run and now-found[path][1]<ARGS.watch_settle:
+                busy[os.path.dirname(path)] = 1
+                continue
+            
+            files[path] = found[path]
+            attrs.pop(path, None)
+            try:
+                a = get_attrs(path)
+            except (subprocess.CalledProcessError, OSError, IOError):
+                a = None
+            
+            if a:
+                attrs[path] = a
+            else:
+                print "WARNING: can't read attributes of a package "+path
+        
+        for path in files.keys():
+            if path not in found:
+                del files[path]
+                attrs.pop(path, None)
+        
+        groups = get_watch_groups(attrs)
+        
+        if first_run:
+            # packages published before are baselines only
+            for key in groups:
+                done[key] = 1
+            save_json(state_path, state)
+            print "Found "+str(len(groups))+" package version(s), waiting for new ones"
+            first_run = False
+        
+        ready = []
+        for key in groups:
+            group = groups[key]
+            if key in done:
+                continue
+            
+            if "debug" not in group and not ARGS.quick:
+                continue
+            
+            pending = [p for p in get_group_pkgs(group) if os.path.dirname(p) in busy]
+            if pending:
+                continue
+            
+            ready.append(key)
+        
+        ready.sort(key=lambda x: (groups[x]["arch"], groups[x]["name"], get_ver_key(groups[x]["ver"])))
+        
+        for key in ready:
+            group = groups[key]
+            
+            prev = None
+            for k in groups:
+                g = groups[k]
+                if g["arch"]!=group["arch"] or g["name"]!=group["name"]:
+                    continue
+                
+                if get_ver_key(g["ver"])>=get_ver_key(group["ver"]):
+                    continue
+                
+                if prev is None or get_ver_key(g["ver"])>get_ver_key(groups[prev]["ver"]):
+                    prev = k
+            
+            if prev:
+                print "Comparing "+prev+" and "+key+" ..."
+                cmd = child_args+["-old"]+get_group_pkgs(groups[prev])+["-new"]+get_group_pkgs(group)
+            elif ARGS.quick:
+                print "No previous version of "+key+", keeping as a baseline"
+                cmd = None
+            else:
+                # the next version will be compared with its dumps
+                print "No previous version of "+key+", creating ABI dumps"
+                cmd = dump_args+["-dump"]+get_group_pkgs(group)
+            
+            if cmd:
+                start = time.time()
+                ecode = subprocess.call(cmd)
+                trace_span(key, "run", start, "main", {"ecode":ecode})
+                if ecode<0:
+                    print "WARNING: "+key+" was interrupted by signal "+str(-ecode)
+                    continue
+                
+                verdict = [c for c in ERROR_CODE if ERROR_CODE[c]==ecode]
+                if verdict:
+                    print "Finished "+key+": "+verdict[0]
+                else:
+                    print "Finished "+key+": exit code "+str(ecode)
+            
+            done[key] = 1
+            save_json(state_path, state)
+        
+        # for the next runs
+        if len(PKG_ATTRS)!=cached:
+            save_json(attrs_cache, PKG_ATTRS)
+            cached = len(PKG_ATTRS)
+        
+        timeout = ARGS.watch_interval
+        if busy:
+            timeout = min(timeout, ARGS.watch_settle)
+        
+        wait_repo(watcher, timeout)
+
+def get_objects_digest(pkg):
+    # shared objects of a release package, read from the package stream
+    pkg_abs = os.path.abspath(pkg)
+    fmt = get_fmt(pkg_abs)
+    
+    members, proc = read_pkg_members(pkg_abs, fmt)
+    
+    digests = []
+    try:
+        for name, size, read in members:
+            name = re.sub(r"\A(\./|/)+", "", name)
+            if re.search(r"lib.*\.so(\..+|\Z)", os.path.basename(name)):
+                data = read()
+                if data[:4]=="\x7fELF":
+                    digests.append(name+" "+hashlib.sha1(data).hexdigest())
+    except (tarfile.TarError, IOError, EOFError, zlib.error):
+        if fmt not in ["tbz2", "xpak"]:
+            digests = None
+    
+    if proc:
+        proc.stdout.close()
+        proc.wait()
+    
+    if digests is None:
+        return None
+    
+    return hashlib.sha1("\n".join(sorted(digests))).hexdigest()
+
+def get_group_digest(group):
+    # shared objects of all release packages of the group
+    digests = []
+    for pkg in group["rel"]:
+        digest = get_objects_digest(pkg)
+        if digest is None:
+            return None
+        digests.append(digest)
+    
+    return hashlib.sha1("\n".join(sorted(digests))).hexdigest()
+
+def get_snapshot_groups(top):
+    found, watcher = scan_repo(top, None)
+    
+    pkgs = {}
+    for path in found:
+        try:
+            attrs = get_attrs(path)
+        except (subprocess.CalledProcessError, OSError, IOError):
+            attrs = None
+        
+        if attrs:
+            pkgs[path] = attrs
+        else:
+            print "WARNING: can't read attributes of a package "+path
+    
+    # the latest version of each package
+    latest = {}
+    groups = get_watch_groups(pkgs)
+    for key in groups:
+        group = groups[key]
+        name = group["arch"]+"/"+group["name"]
+        if name not in latest or get_ver_key(group["ver"])>get_ver_key(latest[name]["ver"]):
+            latest[name] = group
+    
+    return latest
+
+def diff_snapshots(old_dir, new_dir):
+    child_args = get_child_args({"-snapshot":2, "-trace":1})
+    
+    attrs_cache = get_dumps_dir()+"/"+PKG_ATTRS_CACHE
+    PKG_ATTRS.update(load_json(attrs_cache))
+    cached = len(PKG_ATTRS)
+    
+    groups = {}
+    groups["old"] = get_snapshot_groups(os.path.abspath(old_dir))
+    groups["new"] = get_snapshot_groups(os.path.abspath(new_dir))
+    
+    # for the runs of pairs
+    if len(PKG_ATTRS)!=cached:
+        save_json(attrs_cache, PKG_ATTRS)
+    
+    print "Found "+str(len(groups["old"]))+" old and "+str(len(groups["new"]))+" new package(s)"
+    
+    results = []
+    for name in sorted(set(groups["old"].keys()+groups["new"].keys())):
+        item = {}
+        item["Name"] = name
+        
+        if name not in groups["new"]:
+            item["Status"] = "removed"
+            item["OldVersion"] = groups["old"][name]["ver"]
+            results.append(item)
+            continue
+        
+        if name not in groups["old"]:
+            item["Status"] = "added"
+            item["NewVersion"] = groups["new"][name]["ver"]
+            results.append(item)
+            continue
+        
+        old = groups["old"][name]
+        new = groups["new"][name]
+        
+        item["OldVersion"] = old["ver"]
+        item["NewVersion"] = new["ver"]
+        results.append(item)
+        
+        old_digest = get_group_digest(old)
+        new_digest = get_group_digest(new)
+        
+        if old_digest and old_digest==new_digest:
+            print name+": shared objects are not changed"
+            item["Status"] = "unchanged"
+            if not ARGS.src:
+                item["BC"] = 100
+            if not ARGS.bin:
+                item["Source_BC"] = 100
+            continue
+        
+        if "debug" not in old or "debug" not in new:
+            if not ARGS.quick:
+                print "WARNING: debuginfo packages of "+name+" are not found, skipping"
+                item["Status"] = "skipped"
+                item["Reason"] = "NoDebug"
+                continue
+        
+        print "Comparing "+name+" "+old["ver"]+" and "+new["ver"]+" ..."
+        cmd = child_args+["-old"]+get_group_pkgs(old)+["-new"]+get_group_pkgs(new)
+        start = time.time()
+        ecode = subprocess.call(cmd)
+        trace_span(name, "run", start, "main", {"ecode":ecode})
+        
+        report_dir = "quick_report" if ARGS.quick else "compat_report"
+        report_dir += "/"+old["arch"]+"/"+old["name"]+"/"+old["ver"]+"/"+new["ver"]
+        
+        verdict = [c for c in ERROR_CODE if ERROR_CODE[c]==ecode]
+        if verdict and verdict[0] in ["Empty", "NoDebug", "NoABI"]:
+            # nothing to compare in the package
+            item["Status"] = "skipped"
+            item["Reason"] = verdict[0]
+            continue
+        
+        if ecode!=0 or not os.path.exists(report_dir+"/meta.json"):
+            item["Status"] = "failed"
+            if verdict:
+                item["Error"] = verdict[0]
+            else:
+                item["Error"] = "exit code "+str(ecode)
+            continue
+        
+        meta = load_json(report_dir+"/meta.json")
+        item["Status"] = "compared"
+        item["Report"] = report_dir
+        for attr in ["BC", "Source_BC"]:
+            if attr in meta:
+                item[attr] = meta[attr]
+    
+    stats = {}
+    for item in results:
+        stats[item["Status"]] = stats.get(item["Status"], 0)+1
+    
+    summary = {}
+    summary["ToolVersion"] = TOOL_VERSION
+    summary["Old"] = os.path.abspath(old_dir)
+    summary["New"] = os.path.abspath(new_dir)
+    summary["Packages"] = results
+    summary["Stats"] = stats
+    
+    summary_path = "compat_report/snapshot_"+os.path.basename(os.path.abspath(old_dir))+"_"+os.path.basename(os.path.abspath(new_dir))+".json"
+    save_json(summary_path, summary)
+    
+    print "Packages: "+", ".join([str(stats[s])+" "+s for s in sorted(stats)])
+    print "The summary has been saved to: "+summary_path
+    
+    if "failed" in stats:
+        exit_status("Error", "failed to compare "+str(stats["failed"])+" package(s)")
+
+def lock_dump(path, wait):
+    ddir = os.path.dirname(path)
+    try:
+        os.makedirs(ddir)
+    except OSError:
+        # created by a concurrent run
+        if not os.path.isdir(ddir):
+            raise
+    
+    lock_path = ddir+"/ABI.lock"
+    if wait:
+        return lock_file(lock_path)
+    
+    lock = open(lock_path, "a")
+    try:
+        fcntl.flock(lock, fcntl.LOCK_EX|fcntl.LOCK_NB)
+    except IOError as e:
+        lock.close()
+        if e.errno in [errno.EAGAIN, errno.EACCES]:
+            return None
+        raise
+    
+    return lock
+
+def get_dump_job(age, oname, obj_dump_path, e_dir, mem_history, mem_budget, mem_limit):
+    obj = OBJECTS[age][oname]
+    pname = PKGS_ATTR[age]["name"]
+    pver = PKGS_ATTR[age]["ver"]
+    
+    # left by killed runs, the lock is held
+    ddir = os.path.dirname(obj_dump_path)
+    for f in os.listdir(ddir):
+        if re.match(r"\AABI\..+\.dump(\..+\.tmp)?\Z", f):
+            os.remove(ddir+"/"+f)
+    
+    # published when complete
+    tmp_dump_path = ddir+"/ABI."+str(os.getpid())+".dump"
+    
+    cmd_d = [ABI_DUMPER, "-o", tmp_dump_path, "-lver", pver]
+    
+    if ARGS.quiet:
+        cmd_d.append("-quiet")
+    
+    cmd_d.append("-search-debuginfo")
+    cmd_d.append(e_dir[age]["debug"])
+    
+    if PUBLIC_ABI:
+        if HEADERS[age]:
+            cmd_d.append("-public-headers")
+            cmd_d.append(e_dir[age]["devel"])
+    
+    if ARGS.use_tu_dump:
+        cmd_d.append("-use-tu-dump")
+        if ARGS.include_preamble:
+            cmd_d.append("-include-preamble")
+            cmd_d.append(ARGS.include_preamble)
+        if ARGS.include_paths:
+            cmd_d.append("-include-paths")
+            cmd_d.append(ARGS.include_paths)
+    elif ARGS.ignore_tags:
+        cmd_d.append("-ignore-tags")
+        cmd_d.append(ARGS.ignore_tags)
+    
+    if ARGS.keep_registers_and_offsets:
+        cmd_d.append("-keep-registers-and-offsets")
+    
+    cmd_d.append(obj)
+    
+    debuginfo_size = get_debuginfo_size(age, oname)
+    mem_key = pname+"/"+oname
+    
+    job = {}
+    job["name"] = oname+" ("+age+")"
+    job["msg"] = "Creating ABI dump for "+oname+" ("+age+")"
+    job["cmd"] = cmd_d
+    job["log"] = TMP_DIR_INT+"/log_"+age+"_"+get_log_name(oname)
+    job["mem"] = estimate_dump_mem(mem_history, mem_key, debuginfo_size, mem_budget)
+    job["mem_limit"] = mem_limit
+    job["mem_key"] = mem_key
+    job["size"] = debuginfo_size
+    job["age"] = age
+    job["object"] = oname
+    job["dump"] = obj_dump_path
+    job["tmp_dump"] = tmp_dump_path
+    job["outputs"] = [tmp_dump_path]
+    job["args"] = {"object":oname, "age":age, "size":os.path.getsize(obj), "debuginfo_size":debuginfo_size}
+    
+    return job
+
+def run_dump_jobs(dump_jobs, mem_budget, mem_history, mem_history_path):
+    if not dump_jobs:
+        return
+    
+    require_dumper()
+    if PUBLIC_ABI:
+        require_ctags()
+    
+    if ARGS.jobs>1:
+        print "Running "+str(len(dump_jobs))+" ABI dumper(s) in "+str(ARGS.jobs)+" parallel jobs with memory budget of "+format_size(mem_budget)
+    
+    run_jobs(dump_jobs, mem_budget)
+    
+    for job in dump_jobs:
+        if not job["killed"] and job["peak"]:
+            mem_history[job["mem_key"]] = {"peak":job["peak"], "size":job["size"]}
+            if job["cpu"] is not None:
+                mem_history[job["mem_key"]]["cpu"] = job["cpu"]
+    
+    save_json(mem_history_path, mem_history)
+    report_killed_jobs(dump_jobs)
+
+def finish_dump_job(job, abi_dump, failed_dump):
+    age = job["age"]
+    oname = job["object"]
+    obj_dump_path = job["dump"]
+    tmp_dump_path = job["tmp_dump"]
+    
+    with open(TMP_DIR_INT+"/log", "a") as log:
+        log.write(read_file(job["log"]))
+    
+    if job["killed"]:
+        if os.path.exists(tmp_dump_path):
+            os.remove(tmp_dump_path)
+        failed_dump[age][oname] = job["killed"]
+    elif not os.path.exists(tmp_dump_path):
+        if job["ecode"]!=12:
+            exit_status("Error", "failed to create ABI dump for object "+oname+" ("+age+")")
+    else:
+        index = read_dump_index(tmp_dump_path)
+        
+        if index["empty"]:
+            print "WARNING: empty ABI dump for "+oname+" ("+age+")"
+            os.remove(tmp_dump_path)
+            remove_dump(obj_dump_path)
+        elif index["lang"] not in ["C", "C++"]:
+            print "WARNING: unsupported language "+str(index["lang"])+" of "+oname+" ("+age+")"
+            os.remove(tmp_dump_path)
+            remove_dump(obj_dump_path)
+        else:
+            publish_dump(tmp_dump_path, obj_dump_path, index)
+            abi_dump[age][oname] = obj_dump_path
+    
+    job["lock"].close()
+
+def publish_dump(tmp_path, path, index):
+    # readers see either the previous or the new complete dump
+    os.rename(tmp_path, path)
+    
+    st = os.stat(path)
+    index["size"] = st.st_size
+    index["mtime"] = st.st_mtime
+    save_dump_index(path, index)
+
+def report_killed_jobs(jobs):
+    killed = [job for job in jobs if job["killed"]]
+    if not killed:
+        return
+    
+    print "WARNING: "+str(len(killed))+" job(s) killed for resource use:"
+    for job in killed:
+        print "  "+job["name"]+": "+job["killed"]
 
 def scenario():
     signal.signal(signal.SIGINT, int_exit)
@@ -441,9 +3851,23 @@ def scenario():
     global ARGS
     ARGS = init_options()
     
-    global TMP_DIR, TMP_DIR_INT
+    global TRACE, TRACE_START
+    if ARGS.trace:
+        ARGS.trace = os.path.abspath(ARGS.trace)
+        TRACE = []
+        TRACE_START = time.time()
+        
+        # the first lane
+        get_trace_lane("main")
+    
+    global TMP_DIR, TMP_DIR_INT, SPILL_DIR, WORKSPACE_BUDGET
     if ARGS.tmp_dir:
         TMP_DIR = ARGS.tmp_dir
+    elif ARGS.queue:
+        # extracted packages should be visible to workers
+        if not os.path.exists(ARGS.queue):
+            os.makedirs(ARGS.queue)
+        TMP_DIR = tempfile.mkdtemp(dir=os.path.abspath(ARGS.queue))
     else:
         TMP_DIR = tempfile.mkdtemp()
     
@@ -451,25 +3875,104 @@ def scenario():
     if not os.path.exists(TMP_DIR_INT):
         os.makedirs(TMP_DIR_INT)
     
-    if not ARGS.old:
-        exit_status("Error", "old packages are not specified (-old option)")
+    if ARGS.workspace:
+        if ARGS.queue:
+            exit_status("Error", "-workspace can't be used with -queue option")
+        
+        if not os.path.isdir(ARGS.workspace):
+            exit_status("Error", "can't access \'"+ARGS.workspace+"\'")
+        
+        if ARGS.workspace_size and not parse_size(ARGS.workspace_size):
+            exit_status("Error", "invalid size \'"+ARGS.workspace_size+"\' (-workspace-size option)")
+        
+        SPILL_DIR = TMP_DIR_INT
+        WORKSPACE_BUDGET = get_workspace_budget()
+        TMP_DIR_INT = tempfile.mkdtemp(prefix="pkg-abidiff-", dir=ARGS.workspace)
     
-    if not ARGS.new:
-        exit_status("Error", "new packages are not specified (-new option)")
+    if ARGS.reindex:
+        reindex_reports(ARGS.reindex)
+        s_exit("Ok")
     
-    global ABI_CC, ABI_DUMPER, CTAGS
+    if ARGS.query:
+        query_reports(ARGS.query)
+        s_exit("Ok")
     
-    if not check_cmd(ABI_CC):
-        exit_status("Error", "ABI Compliance Checker "+ABI_CC_VER+" or newer is not installed")
+    if ARGS.worker:
+        if not os.path.isdir(ARGS.worker):
+            exit_status("Error", "can't access \'"+ARGS.worker+"\'")
+        
+        run_worker()
+        s_exit("Ok")
     
-    if cmp_vers(get_dumpversion(ABI_CC), ABI_CC_VER)<0:
-        exit_status("Error", "the version of ABI Compliance Checker should be "+ABI_CC_VER+" or newer")
+    if ARGS.export:
+        export_dumps(ARGS.export[0], ARGS.export[1])
+        s_exit("Ok")
     
-    if not check_cmd(ABI_DUMPER):
-        exit_status("Error", "ABI Dumper "+ABI_DUMPER_VER+" or newer is not installed")
+    if ARGS.import_bundle:
+        import_dumps(ARGS.import_bundle)
+        s_exit("Ok")
     
-    if cmp_vers(get_dumpversion(ABI_DUMPER), ABI_DUMPER_VER)<0:
-        exit_status("Error", "the version of ABI Dumper should be "+ABI_DUMPER_VER+" or newer")
+    if ARGS.watch:
+        if ARGS.old or ARGS.new or ARGS.dump:
+            exit_status("Error", "-watch can't be used with -old, -new and -dump options")
+        
+        if ARGS.report_dir:
+            exit_status("Error", "-watch can't be used with -report-dir option")
+        
+        if not os.path.isdir(ARGS.watch):
+            exit_status("Error", "can't access \'"+ARGS.watch+"\'")
+        
+        watch_repo(ARGS.watch)
+        s_exit("Ok")
+    
+    if ARGS.snapshot:
+        if ARGS.old or ARGS.new or ARGS.dump or ARGS.watch:
+            exit_status("Error", "-snapshot can't be used with -old, -new, -dump and -watch options")
+        
+        if ARGS.report_dir:
+            exit_status("Error", "-snapshot can't be used with -report-dir option")
+        
+        for d in ARGS.snapshot:
+            if not os.path.isdir(d):
+                exit_status("Error", "can't access \'"+d+"\'")
+        
+        diff_snapshots(ARGS.snapshot[0], ARGS.snapshot[1])
+        s_exit("Ok")
+    
+    global AGES
+    if ARGS.dump:
+        if ARGS.old or ARGS.new:
+            exit_status("Error", "-dump can't be used with -old and -new options")
+        
+        if ARGS.quick or ARGS.fail_under:
+            exit_status("Error", "-dump can't be used with -quick and -fail-under options")
+        
+        if len(ARGS.dump)==1 and os.path.isdir(ARGS.dump[0]):
+            if not ARGS.dump_key or len(ARGS.dump_key.split("/"))!=3:
+                exit_status("Error", "specify ARCH/NAME/VERSION of the staged tree (-dump-key option)")
+            STAGED["new"] = os.path.abspath(ARGS.dump[0])
+        
+        AGES = ["new"]
+    else:
+        if not ARGS.old:
+            exit_status("Error", "old packages are not specified (-old option)")
+        
+        if not ARGS.new:
+            exit_status("Error", "new packages are not specified (-new option)")
+    
+    global ABI_CC, ABI_DUMPER, CTAGS
+    
+    if ARGS.quick:
+        if ARGS.fail_under:
+            exit_status("Error", "-fail-under can't be used with -quick option")
+        
+        if ARGS.plan:
+            exit_status("Error", "-plan can't be used with -quick option")
+        
+        if not check_cmd("readelf"):
+            exit_status("Error", "can't find readelf")
+    
+    # other tools are checked when a stage needs them
     
     if not ARGS.bin and not ARGS.src:
         ARGS.bin = True
@@ -479,10 +3982,39 @@ def scenario():
         ARGS.rebuild_dumps = True
         ARGS.rebuild_report = True
     
+    if ARGS.fail_under:
+        thresholds = parse_thresholds(ARGS.fail_under)
+        if not thresholds:
+            exit_status("Error", "invalid thresholds \'"+ARGS.fail_under+"\' (-fail-under option)")
+        
+        if "BC" in thresholds and not ARGS.bin:
+            exit_status("Error", "can't check BC threshold with -src option")
+        
+        if "SC" in thresholds and not ARGS.src:
+            exit_status("Error", "can't check SC threshold with -bin option")
+    
+    if ARGS.jobs<1:
+        exit_status("Error", "the number of jobs should be positive (-jobs option)")
+    
+    for opt in ["mem_budget", "job_mem_limit", "extract_cache_size"]:
+        if getattr(ARGS, opt) and not parse_size(getattr(ARGS, opt)):
+            exit_status("Error", "invalid size \'"+getattr(ARGS, opt)+"\' (-"+opt.replace("_", "-")+" option)")
+    
+    # before extracting packages
+    get_mem_budget()
+    
+    if ARGS.extract_cache:
+        ARGS.extract_cache = os.path.abspath(ARGS.extract_cache)
+        if not os.path.exists(ARGS.extract_cache):
+            os.makedirs(ARGS.extract_cache)
+    
     LIST = {}
     LIST["old"] = ARGS.old
     LIST["new"] = ARGS.new
     
+    if ARGS.dump:
+        LIST["new"] = ARGS.dump
+    
     global PKGS
     PKGS["old"] = {}
     PKGS["new"] = {}
@@ -491,8 +4023,21 @@ def scenario():
     PKGS_ATTR["old"] = {}
     PKGS_ATTR["new"] = {}
     
+    for age in STAGED:
+        arch, name, ver = ARGS.dump_key.split("/")
+        PKGS_ATTR[age] = {"name":name, "ver":ver, "arch":arch}
+        
+        # rel, debug and devel files are in the same tree
+        PKGS[age]["rel"] = {STAGED[age]:1}
+        PKGS[age]["debug"] = {STAGED[age]:1}
+        if os.path.isdir(STAGED[age]+"/usr/include"):
+            PKGS[age]["devel"] = {STAGED[age]:1}
+    
     pkg_formats = {}
-    for age in ["old", "new"]:
+    for age in AGES:
+        if age in STAGED:
+            continue
+        
         for pkg in LIST[age]:
             if not os.path.exists(pkg):
                 exit_status("Error", "can't access '"+pkg+"'")
@@ -502,20 +4047,18 @@ def scenario():
             
             fmt = get_fmt(pkg)
             
-            if fmt is None or fmt not in ["rpm", "deb", "apk", "tbz2", "xpak"]:
+            if fmt is None or fmt not in PKG_FORMATS:
                 exit_status("Error", "unknown format of package "+pkg)
             
             pkg_formats[fmt] = 1
     
     if "rpm" in pkg_formats:
-        if not check_cmd("rpm"):
-            exit_status("Error", "can't find RPM package manager")
         if not check_cmd("rpm2cpio"):
             exit_status("Error", "can't find rpm2cpio")
     
     if "deb" in pkg_formats:
-        if not check_cmd("dpkg"):
-            exit_status("Error", "can't find dpkg")
+        if not check_cmd("dpkg-deb"):
+            exit_status("Error", "can't find dpkg-deb")
 
     if "tbz2" in pkg_formats or "xpak" in pkg_formats:
         try:
@@ -523,18 +4066,20 @@ def scenario():
         except ImportError:
             exit_status("Error", "can't find Portage modules")
     
-    for age in ["old", "new"]:
+    # attributes of packages seen before
+    attrs_cache = get_dumps_dir()+"/"+PKG_ATTRS_CACHE
+    PKG_ATTRS.update(load_json(attrs_cache))
+    cached = len(PKG_ATTRS)
+    
+    for age in AGES:
+        if age in STAGED:
+            continue
+        
         pname = {}
         pver = {}
         parch = {}
         for pkg in LIST[age]:
-            fname = os.path.basename(pkg)
-            kind = "rel"
-            
-            if re.match(r".*-(headers-|devel-|dev-|dev_).*", fname):
-                kind = "devel"
-            elif re.match(r".*-(debuginfo-|dbg[_\-]).*", fname):
-                kind = "debug"
+            kind = get_pkg_kind(os.path.basename(pkg))
             
             if kind in PKGS[age]:
                 if kind=="rel":
@@ -568,7 +4113,10 @@ def scenario():
             exit_status("Error", age+" release package is not specified ("+age+")")
         
         if "debug" not in PKGS[age]:
-            exit_status("Error", age+" debuginfo package is not specified ("+age+")")
+            if not ARGS.quick:
+                exit_status("Error", age+" debuginfo package is not specified ("+age+")")
+            pver["debug"] = pver["rel"]
+            parch["debug"] = parch["rel"]
         
         if pver["rel"]!=pver["debug"]:
             exit_status("Error", "different versions of packages ("+age+")")
@@ -588,14 +4136,23 @@ def scenario():
         PKGS_ATTR[age]["ver"] = pver["rel"]
         PKGS_ATTR[age]["arch"] = parch["rel"]
     
-    if PKGS_ATTR["old"]["name"]!=PKGS_ATTR["new"]["name"]:
-        print "WARNING: different names of old and new packages"
+    if len(PKG_ATTRS)>cached:
+        save_json(attrs_cache, PKG_ATTRS)
     
-    if PKGS_ATTR["old"]["arch"]!=PKGS_ATTR["new"]["arch"]:
-        exit_status("Error", "different architectures of old and new packages")
+    if not ARGS.dump:
+        if PKGS_ATTR["old"]["name"]!=PKGS_ATTR["new"]["name"]:
+            print "WARNING: different names of old and new packages"
+        
+        if PKGS_ATTR["old"]["arch"]!=PKGS_ATTR["new"]["arch"]:
+            exit_status("Error", "different architectures of old and new packages")
     
     global PUBLIC_ABI
-    if "devel" in PKGS["old"]:
+    if ARGS.dump:
+        if "devel" in PKGS["new"]:
+            PUBLIC_ABI = True
+        else:
+            print "WARNING: devel package is not specified, can't filter public ABI"
+    elif "devel" in PKGS["old"]:
         if "devel" in PKGS["new"]:
             PUBLIC_ABI = True
             if len(PKGS["old"]["devel"].keys())!=len(PKGS["new"]["devel"].keys()):
@@ -604,70 +4161,87 @@ def scenario():
             exit_status("Error", "new devel package is not specified")
     elif "devel" in PKGS["new"]:
         exit_status("Error", "old devel package is not specified")
-    else:
+    elif not ARGS.quick:
         print "WARNING: devel packages are not specified, can't filter public ABI"
     
-    if PUBLIC_ABI:
-        if not check_cmd(CTAGS):
-            exit_status("Error", "Universal Ctags program is not installed")
-        
-        ctags_ver = get_version(CTAGS)
-        if ctags_ver.lower().find("universal")==-1:
-            exit_status("Error", "requires Universal Ctags")
+    if not ARGS.dump and not ARGS.fail_under and not ARGS.plan:
+        if not ARGS.rebuild_report and not ARGS.rebuild_dumps:
+            # nothing to do, before extracting packages
+            report_dir = get_report_dir("quick_report" if ARGS.quick else "compat_report")
+            if os.path.exists(report_dir):
+                exit_status("Ok", "The report already exists: "+report_dir)
     
-    print "Extracting packages ..."
+    if ARGS.plan:
+        print "Listing packages ..."
+    else:
+        print "Extracting packages ..."
     global FILES
     FILES["old"] = {}
     FILES["new"] = {}
+    HEADERS["old"] = 0
+    HEADERS["new"] = 0
     
     e_dir = {}
     e_dir["old"] = {}
     e_dir["new"] = {}
     
-    for age in ["old", "new"]:
+    stage = time.time()
+    for age in AGES:
         for kind in ["rel", "debug", "devel"]:
             if kind not in PKGS[age]:
                 continue
             
+            if ARGS.quick and kind!="rel":
+                continue
+            
+            if age in STAGED:
+                e_dir[age][kind] = get_staged_dir(STAGED[age], kind)
+                continue
+            
             e_dir[age][kind] = extract_pkgs(age, kind)
-            for root, dirs, files in os.walk(e_dir[age][kind]):
-                for f in files:
-                    fpath = root+"/"+f
-                    
-                    if os.path.islink(fpath):
-                        continue
-                    
-                    fkind = None
-                    if kind=="rel":
-                        if is_object(fpath):
-                            fkind = "object"
-                    elif kind=="debug":
-                        if re.match(r".*\.debug\Z", f):
-                            fkind = "debuginfo"
-                        
-                        if get_fmt(PKGS[age]["debug"].keys()[0])=="deb":
-                            if is_object(fpath):
-                                fkind = "debuginfo"
-                    elif kind=="devel":
-                        if fpath.find("/include/")!=-1 or is_header(f):
-                            fkind = "header"
-                    
-                    if fkind:
-                        if fkind not in FILES[age]:
-                            FILES[age][fkind] = {}
-                        FILES[age][fkind][fpath] = 1
-                    
-                    if kind not in FILES[age]:
-                        FILES[age][kind] = {}
-                    
-                    FILES[age][kind][fpath] = 1
+            settle_workspace(e_dir)
+    
+    if ARGS.extract_cache and not ARGS.plan:
+        evict_extract_cache()
+    
+    trace_span("extract packages", "stage", stage, "main", {})
+    
+    stage = time.time()
+    discover_files(e_dir)
+    trace_span("discover files", "stage", stage, "main", {})
+    
+    stage = time.time()
+    find_objects(e_dir)
+    trace_span("find objects", "stage", stage, "main", {})
+    
+    if ARGS.plan:
+        plan_run()
+        s_exit("Ok")
+    
+    if ARGS.quick:
+        quick_check()
     
     abi_dump = {}
     soname = {}
     short_name = {}
     shortest_name = {}
     
-    for age in ["old", "new"]:
+    dumps_dir = get_dumps_dir()
+    
+    mem_history_path = dumps_dir+"/"+DUMP_MEM_HISTORY
+    mem_history = load_json(mem_history_path)
+    
+    mem_budget = get_mem_budget()
+    
+    job_mem_limit = mem_budget
+    if ARGS.job_mem_limit:
+        job_mem_limit = parse_size(ARGS.job_mem_limit)
+    
+    todo = []
+    failed_dump = {}
+    
+    stage = time.time()
+    for age in AGES:
         print "Creating ABI dumps ("+age+") ..."
         if "debuginfo" not in FILES[age]:
             exit_status("NoDebug", "debuginfo files are not found in "+age+" debuginfo package")
@@ -675,10 +4249,11 @@ def scenario():
         if "object" not in FILES[age]:
             exit_status("NoABI", "shared objects are not found in "+age+" release package")
         
-        objects = FILES[age]["object"].keys()
+        objects = OBJECTS[age].keys()
         objects.sort(key=lambda x: x.lower())
         
         abi_dump[age] = {}
+        failed_dump[age] = {}
         soname[age] = {}
         short_name[age] = {}
         shortest_name[age] = {}
@@ -687,116 +4262,112 @@ def scenario():
         pname = PKGS_ATTR[age]["name"]
         pver = PKGS_ATTR[age]["ver"]
         
-        dump_dir = "abi_dump"
-        if ARGS.dumps_dir:
-            dump_dir = ARGS.dumps_dir
-        
-        dump_dir += "/"+parch+"/"+pname+"/"+pver
+        dump_dir = dumps_dir+"/"+parch+"/"+pname+"/"+pver
         print "Using dumps directory: "+dump_dir
         
-        for obj in objects:
-            oname = os.path.basename(obj)
+        for oname in objects:
+            obj = OBJECTS[age][oname]
             
-            soname[age][oname] = get_soname(obj)
             short_name[age][oname] = get_short_name(oname)
             shortest_name[age][oname] = get_shortest_name(oname)
             
-            obj_dump_path = dump_dir+"/"+oname+"/ABI.dump"
-            
-            if os.path.exists(obj_dump_path):
-                if ARGS.rebuild_dumps:
-                    os.remove(obj_dump_path)
-                else:
-                    print "Using existing ABI dump for "+oname
-                    abi_dump[age][oname] = obj_dump_path
-                    continue
-            
-            print "Creating ABI dump for "+oname
-            
-            cmd_d = [ABI_DUMPER, "-o", obj_dump_path, "-lver", pver]
-            
-            if ARGS.quiet:
-                cmd_d.append("-quiet")
-            
-            cmd_d.append("-search-debuginfo")
-            cmd_d.append(e_dir[age]["debug"])
-            
-            if PUBLIC_ABI:
-                if "header" in FILES[age]:
-                    cmd_d.append("-public-headers")
-                    cmd_d.append(e_dir[age]["devel"])
-            
-            if ARGS.use_tu_dump:
-                cmd_d.append("-use-tu-dump")
-                if ARGS.include_preamble:
-                    cmd_d.append("-include-preamble")
-                    cmd_d.append(ARGS.include_preamble)
-                if ARGS.include_paths:
-                    cmd_d.append("-include-paths")
-                    cmd_d.append(ARGS.include_paths)
-            elif ARGS.ignore_tags:
-                cmd_d.append("-ignore-tags")
-                cmd_d.append(ARGS.ignore_tags)
-            
-            if ARGS.keep_registers_and_offsets:
-                cmd_d.append("-keep-registers-and-offsets")
+            if oname in SAME_OBJECT[age]:
+                # dumped once for all copies
+                continue
             
-            cmd_d.append(obj)
+            soname[age][oname] = get_soname(obj)
             
-            if ARGS.debug:
-                print "Executing "+" ".join(cmd_d)
+            obj_dump_path = dump_dir+"/"+oname+"/ABI.dump"
             
-            ecode = 0
+            # published dumps are complete
+            if os.path.exists(obj_dump_path) and not ARGS.rebuild_dumps:
+                print "Using existing ABI dump for "+oname
+                abi_dump[age][oname] = obj_dump_path
+                continue
             
-            with open(TMP_DIR_INT+"/log", "a") as log:
-                ecode = subprocess.call(cmd_d, stdout=log)
+            todo.append([age, oname, obj_dump_path])
+        
+        for oname in SAME_OBJECT[age]:
+            soname[age][oname] = soname[age][SAME_OBJECT[age][oname]]
+    
+    if ARGS.fail_under:
+        # SONAME changes are known before dumping
+        objs = {}
+        for age in ["old", "new"]:
+            objs[age] = sorted(soname[age].keys(), key=lambda x: x.lower())
+        
+        all_mapped = match_objects(objs["old"], objs["new"], soname, short_name, shortest_name)[0]
+        check_gate_soname(get_changed_soname(all_mapped, soname))
+    
+    # a dump is created by one run at a time, other runs wait and reuse it
+    waited = {}
+    while todo:
+        dump_jobs = []
+        waiting = []
+        for age, oname, obj_dump_path in todo:
+            lock = lock_dump(obj_dump_path, False)
+            if not lock:
+                print "Waiting for ABI dump of "+oname+" ("+age+") created by another run"
+                waiting.append([age, oname, obj_dump_path])
+                continue
             
-            if not os.path.exists(obj_dump_path):
-                if ecode==12:
+            if os.path.exists(obj_dump_path):
+                if not ARGS.rebuild_dumps or obj_dump_path in waited:
+                    lock.close()
+                    print "Using existing ABI dump for "+oname
+                    abi_dump[age][oname] = obj_dump_path
                     continue
-                else:
-                    exit_status("Error", "failed to create ABI dump for object "+oname+" ("+age+")")
             
-            dump_attr = get_dump_attr(obj_dump_path)
+            job = get_dump_job(age, oname, obj_dump_path, e_dir, mem_history, mem_budget, job_mem_limit)
+            job["lock"] = lock
+            dump_jobs.append(job)
+        
+        run_dump_jobs(dump_jobs, mem_budget, mem_history, mem_history_path)
+        
+        for job in dump_jobs:
+            finish_dump_job(job, abi_dump, failed_dump)
+        
+        for age, oname, obj_dump_path in waiting:
+            # released when the other run has published the dump or failed
+            start = time.time()
+            lock_dump(obj_dump_path, True).close()
+            trace_span(oname+" ("+age+")", "wait", start, "main", {"dump":obj_dump_path})
+            waited[obj_dump_path] = 1
+        
+        # not created by the other run
+        todo = waiting
+    
+    for age in AGES:
+        for oname in SAME_OBJECT[age]:
+            obj = SAME_OBJECT[age][oname]
+            if obj in abi_dump[age]:
+                abi_dump[age][oname] = abi_dump[age][obj]
+            elif obj in failed_dump[age]:
+                failed_dump[age][oname] = failed_dump[age][obj]
+    
+    trace_span("create ABI dumps", "stage", stage, "main", {})
+    
+    if ARGS.dump:
+        if failed_dump["new"]:
+            exit_status("Error", "failed to create ABI dumps for "+str(len(failed_dump["new"]))+" object(s)")
+        
+        if check_cmd(ABI_CC):
+            require_checker()
             
-            if dump_attr["empty"]:
-                print "WARNING: empty ABI dump for "+oname+" ("+age+")"
-                os.remove(obj_dump_path)
-            elif dump_attr["lang"] not in ["C", "C++"]:
-                print "WARNING: unsupported language "+dump_attr["lang"]+" of "+oname+" ("+age+")"
-                os.remove(obj_dump_path)
-            else:
-                abi_dump[age][oname] = obj_dump_path
+            # saved to the index, so comparisons don't count them again
+            for oname in sorted(abi_dump["new"].keys()):
+                count_symbols(abi_dump["new"][oname], oname, "new")
+        else:
+            print "WARNING: ABI Compliance Checker is not installed, symbols will be counted when comparing"
         
-    print "Comparing ABIs ..."
-    soname_r = {}
-    short_name_r = {}
-    shortest_name_r = {}
+        print "ABI dumps have been saved to: "+dump_dir
+        s_exit("Ok")
     
-    for age in ["old", "new"]:
-        soname_r[age] = {}
-        for obj in soname[age]:
-            sname = soname[age][obj]
-            if sname not in soname_r[age]:
-                soname_r[age][sname] = {}
-            soname_r[age][sname][obj] = 1
-        
-        short_name_r[age] = {}
-        for obj in short_name[age]:
-            shname = short_name[age][obj]
-            if shname not in short_name_r[age]:
-                short_name_r[age][shname] = {}
-            short_name_r[age][shname][obj] = 1
-        
-        shortest_name_r[age] = {}
-        for obj in shortest_name[age]:
-            shname = shortest_name[age][obj]
-            if shname not in shortest_name_r[age]:
-                shortest_name_r[age][shname] = {}
-            shortest_name_r[age][shname][obj] = 1
-    
-    old_objects = abi_dump["old"].keys()
-    new_objects = abi_dump["new"].keys()
+    print "Comparing ABIs ..."
+    stage = time.time()
+    # objects killed for resource use are reported as N/A
+    old_objects = abi_dump["old"].keys()+failed_dump["old"].keys()
+    new_objects = abi_dump["new"].keys()+failed_dump["new"].keys()
     
     if objects and not old_objects:
         exit_status("Empty", "all ABI dumps are empty or invalid")
@@ -804,165 +4375,89 @@ def scenario():
     old_objects.sort(key=lambda x: x.lower())
     new_objects.sort(key=lambda x: x.lower())
     
-    mapped = {}
-    mapped_r = {}
-    removed = {}
-    
     report_dir = None
-    if ARGS.report_dir:
-        report_dir = ARGS.report_dir
+    if ARGS.fail_under:
+        # the gate doesn't leave a report
+        report_dir = TMP_DIR_INT+"/gate_report"
+        os.makedirs(report_dir)
     else:
-        report_dir = "compat_report"
-        report_dir += "/"+PKGS_ATTR["old"]["arch"]+"/"+PKGS_ATTR["old"]["name"]
-        report_dir += "/"+PKGS_ATTR["old"]["ver"]+"/"+PKGS_ATTR["new"]["ver"]
+        report_dir = init_report_dir("compat_report")
     
-    if os.path.exists(report_dir):
-        if ARGS.rebuild_report:
-            if os.path.exists(report_dir+"/index.html"):
-                os.remove(report_dir+"/index.html")
-        else:
-            exit_status("Ok", "The report already exists: "+report_dir)
-    else:
-        os.makedirs(report_dir)
+    # part of the up-to-date check of per-object reports
+    require_checker()
     
-    compat = {}
-    renamed_object = {}
-    for obj in old_objects:
-        new_obj = None
-        
-        # match by SONAME
-        if obj in soname["old"]:
-            sname = soname["old"][obj]
-            if sname in soname_r["new"]:
-                bysoname = soname_r["new"][sname].keys()
-                if bysoname and len(bysoname)==1:
-                    new_obj = bysoname[0]
-        
-        # match by name
-        if new_obj is None:
-            if obj in new_objects:
-                new_obj = obj
-        
-        # match by short name
-        if new_obj is None:
-            if obj in short_name["old"]:
-                shname = short_name["old"][obj]
-                if shname in short_name_r["new"]:
-                    byshort = short_name_r["new"][shname].keys()
-                    if byshort and len(byshort)==1:
-                        new_obj = byshort[0]
-        
-        # match by shortest name
-        if new_obj is None:
-            if obj in shortest_name["old"]:
-                shname = shortest_name["old"][obj]
-                if shname in shortest_name_r["new"]:
-                    byshort = shortest_name_r["new"][shname].keys()
-                    if byshort and len(byshort)==1:
-                        new_obj = byshort[0]
-        
-        if new_obj is None:
-            removed[obj] = 1
-            continue
-        
-        mapped[obj] = new_obj
-        mapped_r[new_obj] = obj
+    mapped, removed, added, renamed_object, match_reason = match_objects(old_objects, new_objects, soname, short_name, shortest_name)
     
-    added = {}
-    for obj in new_objects:
-        if obj not in mapped_r:
-            added[obj] = 1
+    compat = {}
+    failed = {}
+    cmp_jobs = []
     
-    # one object
-    if not mapped:
-        if len(old_objects)==1 and len(new_objects)==1:
-            obj = old_objects[0]
-            new_obj = new_objects[0]
-            
-            mapped[obj] = new_obj
-            renamed_object[obj] = new_obj
-            
-            removed.pop(obj, None)
-            added.pop(new_obj, None)
+    # pairs of identical objects are compared once
+    compared = {}
+    same_as = {}
     
     mapped_objs = mapped.keys()
     mapped_objs.sort(key=lambda x: x.lower())
     for obj in mapped_objs:
         new_obj = mapped[obj]
         
-        if obj not in abi_dump["old"]:
+        if obj in failed_dump["old"]:
+            failed[obj] = "abi-dumper (old): "+failed_dump["old"][obj]
             continue
         
-        if new_obj not in abi_dump["new"]:
+        if new_obj in failed_dump["new"]:
+            failed[obj] = "abi-dumper (new): "+failed_dump["new"][new_obj]
             continue
         
-        print "Comparing "+obj+" (old) and "+new_obj+" (new)"
-        
-        obj_report_dir = report_dir+"/"+obj
-        
-        if os.path.exists(obj_report_dir):
-            shutil.rmtree(obj_report_dir)
-        
-        bin_report = obj_report_dir+"/abi_compat_report.html"
-        src_report = obj_report_dir+"/src_compat_report.html"
-        
-        cmd_c = [ABI_CC, "-l", obj, "-component", "object"]
-        
-        if ARGS.bin:
-            cmd_c.append("-bin")
-            cmd_c.extend(["-bin-report-path", bin_report])
-        if ARGS.src:
-            cmd_c.append("-src")
-            cmd_c.extend(["-src-report-path", src_report])
-        
-        cmd_c.append("-old")
-        cmd_c.append(abi_dump["old"][obj])
+        if obj not in abi_dump["old"]:
+            continue
         
-        cmd_c.append("-new")
-        cmd_c.append(abi_dump["new"][new_obj])
+        if new_obj not in abi_dump["new"]:
+            continue
         
-        if ARGS.debug:
-            print "Executing "+" ".join(cmd_c)
+        pair = (abi_dump["old"][obj], abi_dump["new"][new_obj])
+        if pair in compared:
+            same_as[obj] = compared[pair]
+            continue
         
-        with open(TMP_DIR_INT+"/log", "w") as log:
-            subprocess.call(cmd_c, stdout=log)
+        compared[pair] = obj
         
-        if ARGS.bin:
-            if not os.path.exists(bin_report):
-                print_err("ERROR: failed to create BC report for object "+obj)
-                continue
+        cmp_key = get_cmp_key(new_obj, abi_dump["old"][obj], abi_dump["new"][new_obj])
         
-        if ARGS.src:
-            if not os.path.exists(src_report):
-                print_err("ERROR: failed to create SC report for object "+obj)
+        if read_cmp_key(report_dir+"/"+obj)==cmp_key:
+            if read_reports(obj, report_dir, compat):
+                print obj+": the report is up to date"
                 continue
         
-        compat[obj] = {}
-        res = []
-        
-        if ARGS.bin:
-            compat[obj]["bin"] = read_stat(bin_report, report_dir)
-            res.append("BC: "+format_num(100-float(compat[obj]["bin"]["affected"]))+"%")
-        
-        if ARGS.src:
-            compat[obj]["src"] = read_stat(src_report, report_dir)
-            res.append("SC: "+format_num(100-float(compat[obj]["src"]["affected"]))+"%")
+        if get_dump_digest(abi_dump["old"][obj])==get_dump_digest(abi_dump["new"][new_obj]):
+            write_identical_reports(obj, report_dir, compat)
+            write_cmp_key(report_dir+"/"+obj, cmp_key)
+            continue
         
-        print ", ".join(res)
+        job = get_cmp_job(obj, new_obj, abi_dump, report_dir, job_mem_limit)
+        job["key"] = cmp_key
+        cmp_jobs.append(job)
+    
+    if ARGS.fail_under:
+        run_gate(cmp_jobs, compat, removed, get_changed_soname(mapped, soname), abi_dump, report_dir, mem_budget, same_as)
+    
+    run_jobs(cmp_jobs, mem_budget)
+    
+    for job in cmp_jobs:
+        read_cmp_job(job, report_dir, compat, failed)
+    
+    copy_results(same_as, compat, failed)
     
-    if mapped_objs and not compat:
+    report_killed_jobs(cmp_jobs)
+    
+    trace_span("compare ABIs", "stage", stage, "main", {"jobs":len(cmp_jobs)})
+    
+    if mapped_objs and not compat and not failed:
         exit_status("Error", "failed to create reports for objects")
     
+    stage = time.time()
     object_symbols = {}
-    changed_soname = {}
-    for obj in mapped:
-        new_obj = mapped[obj]
-        
-        old_soname = soname["old"][obj]
-        new_soname = soname["new"][new_obj]
-        
-        if old_soname and new_soname and old_soname!=new_soname:
-            changed_soname[obj] = new_soname
+    changed_soname = get_changed_soname(mapped, soname)
     
     # JSON report
     affected_t = 0
@@ -1011,6 +4506,9 @@ def scenario():
     removed_by_objects_t = 0
     
     for obj in removed:
+        if obj in failed_dump["old"]:
+            failed[obj] = "abi-dumper (old): "+failed_dump["old"][obj]
+            continue
         old_dump = abi_dump["old"][obj]
         removed_by_objects_t += count_symbols(old_dump, obj, "old")
     
@@ -1027,7 +4525,7 @@ def scenario():
             bc_src -= affected_t_src/total_funcs
     
     if old_objects and removed:
-        delta = (1-(removed_by_objects_t/(total_funcs+removed_by_objects_t)))
+        delta = get_removed_delta(removed_by_objects_t, total_funcs)
         bc *= delta
         if ARGS.src:
             bc_src *= delta
@@ -1038,91 +4536,59 @@ def scenario():
     if ARGS.src:
         bc_src = format_num(bc_src)
     
-    meta = []
+    meta = collections.OrderedDict()
     if ARGS.bin:
-        meta.append("\"BC\": "+str(bc))
-        meta.append("\"BC_Effective\": "+str(bc_eff))
+        meta["BC"] = json.loads(bc)
+        meta["BC_Effective"] = json.loads(bc_eff)
     if ARGS.src:
-        meta.append("\"Source_BC\": "+str(bc_src))
-    meta.append("\"Added\": "+str(added_t))
-    meta.append("\"Removed\": "+str(removed_t))
+        meta["Source_BC"] = json.loads(bc_src)
+    meta["Added"] = added_t
+    meta["Removed"] = removed_t
     if ARGS.bin:
-        meta.append("\"TotalProblems\": "+str(problems_t))
+        meta["TotalProblems"] = problems_t
     if ARGS.src:
-        meta.append("\"Source_TotalProblems\": "+str(problems_t_src))
-    meta.append("\"ObjectsAdded\": "+str(len(added)))
-    meta.append("\"ObjectsRemoved\": "+str(len(removed)))
-    meta.append("\"ChangedSoname\": "+str(len(changed_soname)))
+        meta["Source_TotalProblems"] = problems_t_src
+    meta["ObjectsAdded"] = len(added)
+    meta["ObjectsRemoved"] = len(removed)
+    meta["ChangedSoname"] = len(changed_soname)
+    meta["ObjectsFailed"] = failed
     
-    write_file(report_dir+"/meta.json", "{\n  "+",\n  ".join(meta)+"\n}\n")
+    write_meta(report_dir+"/meta.json", meta)
     
     # HTML report
-    n1 = PKGS_ATTR["old"]["name"]
-    n2 = PKGS_ATTR["new"]["name"]
-    
-    v1 = PKGS_ATTR["old"]["ver"]
-    v2 = PKGS_ATTR["new"]["ver"]
-    
-    arch = PKGS_ATTR["old"]["arch"]
-    
-    report = "<h1>ABI report"
-    if n1==n2:
-        title = n1+": API/ABI report between "+v1+" and "+v2+" versions"
-        keywords = n1+", API, ABI, changes, compatibility, report"
-        desc = "API/ABI compatibility report between "+v1+" and "+v2+" versions of the "+n1
-        report += " for "+n1+": <u>"+v1+"</u> vs <u>"+v2+"</u>"
-    else:
-        title = "API/ABI report between "+n1+"-"+v1+" and "+n2+"-"+v2+" packages"
-        keywords = n1+", "+n2+", API, ABI, changes, compatibility, report"
-        desc = "API/ABI compatibility report between "+n1+"-"+v1+" and "+n2+"-"+v2+" packages"
-        report += " for <u>"+n1+"-"+v1+"</u> vs <u>"+n2+"-"+v2+"</u>"
+    subject = "Public ABI +<br/>Private ABI"
+    if PUBLIC_ABI:
+        subject = "Public ABI"
     
+    note = None
     if not ARGS.bin:
-        report += " (source compatibility)"
+        note = "source compatibility"
     
-    report += "</h1>\n"
+    title, keywords, desc, info = compose_test_info(subject, note)
     
-    report += "<h2>Test Info</h2>\n"
-    report += "<table class='summary'>\n"
-    report += "<tr>\n"
-    report += "<th class='left'>Package</th><td class='right'>"+n1+"</td>\n"
-    report += "</tr>\n"
-    report += "<tr>\n"
-    report += "<th class='left'>Old Version</th><td class='right'>"+v1+"</td>\n"
-    report += "</tr>\n"
-    report += "<tr>\n"
-    report += "<th class='left'>New Version</th><td class='right'>"+v2+"</td>\n"
-    report += "</tr>\n"
-    report += "<tr>\n"
-    report += "<th class='left'>Arch</th><td class='right'>"+arch+"</td>\n"
-    report += "</tr>\n"
-    report += "<tr>\n"
-    if PUBLIC_ABI:
-        report += "<th class='left'>Subject</th><td class='right'>Public ABI</td>\n"
-    else:
-        report += "<th class='left'>Subject</th><td class='right'>Public ABI +<br/>Private ABI</td>\n"
-    report += "</tr>\n"
-    report += "</table>\n"
+    html = open(report_dir+"/index.html", "w")
+    html.write(compose_html_head(title, keywords, desc)+"<body>\n")
+    html.write(info)
     
-    report += "<h2>Test Result</h2>\n"
-    report += "<span class='result'>\n"
+    html.write("<h2>Test Result</h2>\n")
+    html.write("<span class='result'>\n")
     if ARGS.bin:
-        report += "Binary compatibility: <span class='"+get_bc_class(bc_eff, problems_t)+"' title='Avg. binary compatibility rate'>"+bc_eff+"%</span>\n"
+        html.write("Binary compatibility: <span class='"+get_bc_class(bc_eff, problems_t)+"' title='Avg. binary compatibility rate'>"+bc_eff+"%</span>\n")
         if changed_soname.keys():
-            report += " (<span class='incompatible' title='Effective binary compatibility is "+bc_eff+"%"+" due to changed SONAME'>changed SONAME</span>)"
-        report += "<br/>\n"
+            html.write(" (<span class='incompatible' title='Effective binary compatibility is "+bc_eff+"%"+" due to changed SONAME'>changed SONAME</span>)")
+        html.write("<br/>\n")
     
     if ARGS.src:
-        report += "Source compatibility: <span class='"+get_bc_class(bc_src, problems_t_src)+"' title='Avg. source compatibility rate'>"+bc_src+"%</span>\n"
-        report += "<br/>\n"
+        html.write("Source compatibility: <span class='"+get_bc_class(bc_src, problems_t_src)+"' title='Avg. source compatibility rate'>"+bc_src+"%</span>\n")
+        html.write("<br/>\n")
     
-    report += "</span>\n"
+    html.write("</span>\n")
     
-    report += "<h2>Packages</h2>\n"
-    report += "<table class='summary'>\n"
-    report += "<tr>\n"
-    report += "<th>Old</th><th>New</th><th title='*.so, *.debug and header files'>Files</th>\n"
-    report += "</tr>\n"
+    html.write("<h2>Packages</h2>\n")
+    html.write("<table class='summary'>\n")
+    html.write("<tr>\n")
+    html.write("<th>Old</th><th>New</th><th title='*.so, *.debug and header files'>Files</th>\n")
+    html.write("</tr>\n")
     
     target = {}
     target["rel"] = "object"
@@ -1144,66 +4610,70 @@ def scenario():
         pfiles = False
         
         for i in range(0, total):
-            report += "<tr>\n"
-            report += "<td class='object'>"+os.path.basename(pkgs1[i])+"</td>\n"
-            report += "<td class='object'>"+os.path.basename(pkgs2[i])+"</td>\n"
+            html.write("<tr>\n")
+            html.write("<td class='object'>"+os.path.basename(pkgs1[i])+"</td>\n")
+            html.write("<td class='object'>"+os.path.basename(pkgs2[i])+"</td>\n")
             if not pfiles:
                 if total>1:
-                    report += "<td class='center' rowspan='"+str(total)+"'>"
+                    html.write("<td class='center' rowspan='"+str(total)+"'>")
                 else:
-                    report += "<td class='center'>"
-                if target[kind] in FILES["old"]:
-                    report += str(len(FILES["old"][target[kind]]))
+                    html.write("<td class='center'>")
+                if target[kind]=="header":
+                    html.write(str(HEADERS["old"]))
+                elif target[kind] in FILES["old"]:
+                    html.write(str(len(FILES["old"][target[kind]])))
                 else:
-                    report += "0"
-                report += "</td>\n"
+                    html.write("0")
+                html.write("</td>\n")
                 pfiles = True
-            report += "</tr>\n"
+            html.write("</tr>\n")
     
-    report += "</table>\n"
+    html.write("</table>\n")
     
-    report += "<h2>Shared Objects</h2>\n"
-    report += "<table class='summary'>\n"
+    html.write("<h2>Shared Objects</h2>\n")
+    html.write("<table class='summary' id='objects'>\n")
     
     cols = 5
     if ARGS.bin and ARGS.src:
-        report += "<tr>\n"
-        report += "<th rowspan='2'>Object</th>\n"
-        report += "<th colspan='2'>Compatibility</th>\n"
-        report += "<th rowspan='2'>Added<br/>Symbols</th>\n"
-        report += "<th rowspan='2'>Removed<br/>Symbols</th>\n"
-        report += "<th rowspan='2'>Total<br/>Symbols</th>\n"
-        report += "</tr>\n"
-        
-        report += "<tr>\n"
-        report += "<th title='Binary compatibility'>BC</th>\n"
-        report += "<th title='Source compatibility'>SC</th>\n"
-        report += "</tr>\n"
+        html.write("<tr>\n")
+        html.write("<th rowspan='2' data-key='name'>Object</th>\n")
+        html.write("<th colspan='2'>Compatibility</th>\n")
+        html.write("<th rowspan='2' data-key='added'>Added<br/>Symbols</th>\n")
+        html.write("<th rowspan='2' data-key='removed'>Removed<br/>Symbols</th>\n")
+        html.write("<th rowspan='2' data-key='symbols'>Total<br/>Symbols</th>\n")
+        html.write("</tr>\n")
+        
+        html.write("<tr>\n")
+        html.write("<th title='Binary compatibility' data-key='bc'>BC</th>\n")
+        html.write("<th title='Source compatibility' data-key='sc'>SC</th>\n")
+        html.write("</tr>\n")
     else:
         cols -= 1
-        report += "<tr>\n"
-        report += "<th>Object</th>\n"
+        html.write("<tr>\n")
+        html.write("<th data-key='name'>Object</th>\n")
         
         if ARGS.bin:
-            report += "<th>Binary<br/>Compatibility</th>\n"
+            html.write("<th data-key='bc'>Binary<br/>Compatibility</th>\n")
         else:
-            report += "<th>Source<br/>Compatibility</th>\n"
+            html.write("<th data-key='sc'>Source<br/>Compatibility</th>\n")
         
-        report += "<th>Added<br/>Symbols</th>\n"
-        report += "<th>Removed<br/>Symbols</th>\n"
-        report += "<th>Total<br/>Symbols</th>\n"
-        report += "</tr>\n"
+        html.write("<th data-key='added'>Added<br/>Symbols</th>\n")
+        html.write("<th data-key='removed'>Removed<br/>Symbols</th>\n")
+        html.write("<th data-key='symbols'>Total<br/>Symbols</th>\n")
+        html.write("</tr>\n")
+    
+    json_report = open_json_report(report_dir+"/report.json", meta)
     
     for obj in new_objects:
         if obj in added:
-            report += "<tr>\n"
-            report += "<td class='object'>"+obj+"</td>\n"
-            report += "<td colspan=\'"+str(cols)+"\' class='added'>Added to package</td>\n"
-            report += "</tr>\n"
+            html.write(compose_row_start(obj, {}))
+            html.write("<td class='object'>"+obj+"</td>\n")
+            html.write("<td colspan=\'"+str(cols)+"\' class='added'>Added to package</td>\n")
+            html.write("</tr>\n")
+            
+            write_json_item(json_report, {"object":obj, "status":"added"})
     
     for obj in old_objects:
-        report += "<tr>\n"
-        
         name = obj
         
         if obj in mapped:
@@ -1214,14 +4684,40 @@ def scenario():
             elif obj in renamed_object:
                 name += "<br/>"
                 name += "<br/>"
-                name += "<span class='incompatible'>(changed file name from<br/>\""+obj+"\"<br/>to<br/>\""+renamed_object[obj]+"\")</span>"
+                name += "<span class='incompatible'>(changed file name from<br/>\""+obj+"\"<br/>to<br/>\""+renamed_object[obj]+"\",<br/>matched by "+match_reason[obj]+")</span>"
+        
+        if obj in failed:
+            name += "<br/>"
+            name += "<br/>"
+            name += "<span class='warning'>("+failed[obj]+")</span>"
         
-        report += "<td class='object'>"+name+"</td>\n"
+        item = {"object":obj}
+        
+        if obj in same_as:
+            name += "<br/>"
+            name += "<br/>"
+            name += "(identical to "+same_as[obj]+")"
+            item["same_as"] = same_as[obj]
         
         if obj in mapped:
+            item["new_object"] = mapped[obj]
+            item["old_soname"] = soname["old"][obj]
+            item["new_soname"] = soname["new"][mapped[obj]]
+            item["changed_soname"] = (obj in changed_soname)
+            item["renamed"] = (obj in renamed_object)
+            item["match"] = match_reason[obj]
+            
             if obj not in compat:
+                html.write(compose_row_start(obj, {}))
+                html.write("<td class='object'>"+name+"</td>\n")
                 for i in range(0, cols):
-                    report += "<td>N/A</td>\n"
+                    html.write("<td>N/A</td>\n")
+                html.write("</tr>\n")
+                
+                item["status"] = "failed"
+                if obj in failed:
+                    item["reason"] = failed[obj]
+                write_json_item(json_report, item)
                 continue
             
             if ARGS.bin:
@@ -1240,59 +4736,75 @@ def scenario():
                 cclass_src = get_bc_class(rate_src, total_src)
                 rpath_src = compat[obj]["src"]["path"]
             
+            if not ARGS.bin:
+                added_symbols = added_symbols_src
+                removed_symbols = removed_symbols_src
+                rpath = rpath_src
+            
+            item["status"] = "compared"
+            item["added"] = int(added_symbols)
+            item["removed"] = int(removed_symbols)
+            item["symbols"] = object_symbols[obj]
+            if ARGS.bin:
+                item["bc"] = float(format_num(rate))
+                item["problems"] = total
+                item["bin_report"] = rpath
+            if ARGS.src:
+                item["sc"] = float(format_num(rate_src))
+                item["src_problems"] = total_src
+                item["src_report"] = rpath_src
+            
+            html.write(compose_row_start(obj, item))
+            html.write("<td class='object'>"+name+"</td>\n")
+            
             if ARGS.bin:
-                report += "<td class=\'"+cclass+"\'>"
-                report += "<a href='"+rpath+"'>"+format_num(rate)+"%</a>"
-                report += "</td>\n"
+                html.write("<td class=\'"+cclass+"\'>")
+                html.write("<a href='"+rpath+"'>"+format_num(rate)+"%</a>")
+                html.write("</td>\n")
             
             if ARGS.src:
-                report += "<td class=\'"+cclass_src+"\'>"
-                report += "<a href='"+rpath_src+"'>"+format_num(rate_src)+"%</a>"
-                report += "</td>\n"
+                html.write("<td class=\'"+cclass_src+"\'>")
+                html.write("<a href='"+rpath_src+"'>"+format_num(rate_src)+"%</a>")
+                html.write("</td>\n")
             
-            if not ARGS.bin:
-                if int(added_symbols_src)>0:
-                    report += "<td class='added'><a class='num' href='"+rpath_src+"#Added'>"+added_symbols_src+" new</a></td>\n"
-                else:
-                    report += "<td class='ok'>0</td>\n"
-                
-                if int(removed_symbols_src)>0:
-                    report += "<td class='removed'><a class='num' href='"+rpath_src+"#Removed'>"+removed_symbols_src+" removed</a></td>\n"
-                else:
-                    report += "<td class='ok'>0</td>\n"
+            if int(added_symbols)>0:
+                html.write("<td class='added'><a class='num' href='"+rpath+"#Added'>"+added_symbols+" new</a></td>\n")
             else:
-                if int(added_symbols)>0:
-                    report += "<td class='added'><a class='num' href='"+rpath+"#Added'>"+added_symbols+" new</a></td>\n"
-                else:
-                    report += "<td class='ok'>0</td>\n"
-                
-                if int(removed_symbols)>0:
-                    report += "<td class='removed'><a class='num' href='"+rpath+"#Removed'>"+removed_symbols+" removed</a></td>\n"
-                else:
-                    report += "<td class='ok'>0</td>\n"
+                html.write("<td class='ok'>0</td>\n")
+            
+            if int(removed_symbols)>0:
+                html.write("<td class='removed'><a class='num' href='"+rpath+"#Removed'>"+removed_symbols+" removed</a></td>\n")
+            else:
+                html.write("<td class='ok'>0</td>\n")
             
-            report += "<td>"+str(object_symbols[obj])+"</td>\n"
+            html.write("<td>"+str(object_symbols[obj])+"</td>\n")
+            html.write("</tr>\n")
         elif obj in removed:
-            report += "<td colspan=\'"+str(cols)+"\' class='removed'>Removed from package</td>\n"
+            html.write(compose_row_start(obj, {}))
+            html.write("<td class='object'>"+name+"</td>\n")
+            html.write("<td colspan=\'"+str(cols)+"\' class='removed'>Removed from package</td>\n")
+            html.write("</tr>\n")
+            
+            item["status"] = "removed"
+            write_json_item(json_report, item)
+            continue
         
-        report += "</tr>\n"
+        write_json_item(json_report, item)
     
-    report += "</table>\n"
+    close_json_report(json_report)
     
-    report += "<br/>\n"
-    report += "<br/>\n"
+    html.write("</table>\n")
+    html.write(compose_table_script("objects"))
     
-    report += "<hr/>\n"
-    report += "<div class='footer' align='right'><i>Generated by <a href='https://github.com/lvc/pkg-abidiff'>Package ABI Diff</a> "+TOOL_VERSION+" &#160;</i></div>\n"
-    report += "<br/>\n"
+    html.write(compose_footer())
+    html.write("\n</body>\n</html>\n")
+    html.close()
     
-    report = compose_html_head(title, keywords, desc)+"<body>\n"+report+"\n</body>\n</html>\n"
+    print "The report has been generated to: "+report_dir+"/index.html"
     
-    if not os.path.exists(report_dir):
-        os.makedirs(report_dir)
+    update_reports_index(report_dir, "full", meta)
     
-    write_file(report_dir+"/index.html", report)
-    print "The report has been generated to: "+report_dir+"/index.html"
+    trace_span("write report", "report", stage, "main", {"report_dir":report_dir, "objects":len(old_objects)+len(added)})
     
     res = []
     
@@ -1306,8 +4818,9 @@ def scenario():
     
     s_exit("Ok")
 
-try:
-    scenario()
-except Exception as e:
-    print traceback.format_exc()
-    s_exit("Error")
+if __name__=="__main__":
+    try:
+        scenario()
+    except Exception as e:
+        print traceback.format_exc()
+        s_exit("Error")
@@ -0,0 +1,112 @@
+import gzip
+import imp
+import io
+import os
+import shutil
+import struct
+import tarfile
+import tempfile
+import unittest
+
+TOOL = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "pkg-abidiff.py")
+tool = imp.load_source("pkg_abidiff", TOOL)
+
+def make_rpm_header(tags):
+    index = ""
+    store = ""
+    for tag in sorted(tags):
+        index += struct.pack(">iiii", tag, 6, len(store), 1)
+        store += tags[tag]+"\0"
+    
+    return "\x8e\xad\xe8\x01\0\0\0\0"+struct.pack(">II", len(tags), len(store))+index+store
+
+def make_tar(members):
+    data = io.BytesIO()
+    tar = tarfile.open(fileobj=data, mode="w")
+    for name in members:
+        info = tarfile.TarInfo(name)
+        info.size = len(members[name])
+        tar.addfile(info, io.BytesIO(members[name]))
+    tar.close()
+    
+    return data.getvalue()
+
+class TestHelpers(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def write(self, name, data):
+        path = os.path.join(self.tmp, name)
+        with open(path, "wb") as f:
+            f.write(data)
+        
+        return path
+
+    def test_get_removed_delta(self):
+        self.assertEqual(tool.get_removed_delta(0, 100), 1.0)
+        self.assertAlmostEqual(tool.get_removed_delta(20, 80), 0.8)
+        self.assertAlmostEqual(tool.get_removed_delta(1, 2), 2.0/3)
+
+    def test_parse_thresholds(self):
+        self.assertEqual(tool.parse_thresholds("BC=90"), {"BC":90.0})
+        self.assertEqual(tool.parse_thresholds("bc = 99.5, SC=80"), {"BC":99.5, "SC":80.0})
+        self.assertEqual(tool.parse_thresholds("BC=90,XY=1"), None)
+        self.assertEqual(tool.parse_thresholds("BC="), None)
+        self.assertEqual(tool.parse_thresholds(""), None)
+
+    def test_parse_size(self):
+        self.assertEqual(tool.parse_size("100"), 100)
+        self.assertEqual(tool.parse_size("4k"), 4096)
+        self.assertEqual(tool.parse_size("1.5G"), 1536*1024**2)
+        self.assertEqual(tool.parse_size(" 2MB "), 2*1024**2)
+        self.assertEqual(tool.parse_size("2X"), None)
+        self.assertEqual(tool.parse_size("-1M"), None)
+
+    def test_get_history_ratio(self):
+        base = tool.DUMP_MEM_BASE
+        size = tool.HISTORY_MIN_SIZE
+        self.assertEqual(tool.get_history_ratio({}, "peak", base, 8), 8)
+        
+        # small objects and runs without the attribute are not taken
+        history = {"small":{"size":size-1, "peak":base+100*size}, "none":{"size":size, "peak":None}}
+        self.assertEqual(tool.get_history_ratio(history, "peak", base, 8), 8)
+        
+        history = {}
+        for k in range(0, 10):
+            history[str(k)] = {"size":size, "peak":base+(k+1)*size}
+        self.assertEqual(tool.get_history_ratio(history, "peak", base, 8), 9.0)
+        
+        # runs below the base give zero, not a negative ratio
+        history = {"a":{"size":size, "peak":base-size}}
+        self.assertEqual(tool.get_history_ratio(history, "peak", base, 8), 0.0)
+
+    def test_read_rpm_header(self):
+        sig = make_rpm_header({})
+        main = make_rpm_header({1000:"foo", 1001:"1.2", 1002:"3.fc40", 1022:"x86_64", 1004:"summary"})
+        path = self.write("foo.rpm", "\xed\xab\xee\xdb"+"\0"*92+sig+"\0"*((8-len(sig)%8)%8)+main)
+        self.assertEqual(tool.read_rpm_header(path), {"name":"foo", "version":"1.2", "release":"3.fc40", "arch":"x86_64"})
+        
+        self.assertEqual(tool.read_rpm_header(self.write("bad.rpm", "\0"*200)), None)
+        self.assertEqual(tool.read_rpm_header(self.write("short.rpm", "\xed\xab\xee\xdb"+"\0"*92+sig[:10])), None)
+
+    def test_read_apk_info(self):
+        # control part follows the signature as another gzip stream
+        parts = []
+        for members in [{".SIGN.RSA.key":"sig"}, {".PKGINFO":"pkgname = foo\npkgver = 1.0-r0\n"}]:
+            data = io.BytesIO()
+            with gzip.GzipFile(fileobj=data, mode="wb") as f:
+                f.write(make_tar(members)[:-1024])
+            parts.append(data.getvalue())
+        
+        path = self.write("foo.apk", "".join(parts))
+        self.assertEqual(tool.read_apk_info(path), "pkgname = foo\npkgver = 1.0-r0\n")
+        
+        self.assertEqual(tool.read_apk_info(self.write("bad.apk", "not an archive")), None)
+        self.assertEqual(tool.read_apk_info(self.write("cut.apk", parts[1][:20])), None)
+
+if __name__=="__main__":
+    unittest.main()